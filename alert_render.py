@@ -0,0 +1,297 @@
+import gzip
+import html
+import string
+from functools import lru_cache
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.mime.application import MIMEApplication
+
+
+class _BoundedBody:
+    """AlertDocument 内部使用的有长度上限的正文缓冲区
+
+    正文片段先放入列表，最后一次性拼接，避免逐行 += 带来的重复拷贝。
+    正文超过 max_chars 后不再追加明细，只统计被省略的行数，
+    因此无论匹配多少行，占用的内存都有上限。
+    """
+
+    def __init__(self, header, max_chars=200000,
+                 note="\n... 另有 {omitted} 条记录因正文长度限制未显示（共 {rows} 条）\n"):
+        self.max_chars = max_chars
+        self.note = note
+        self.rows = 0
+        self.omitted = 0
+        self._parts = [header]
+        self._length = len(header)
+
+    def add_row(self, text):
+        """追加一行明细，超出上限时只计数"""
+        self.rows += 1
+        if self.omitted or self._length + len(text) > self.max_chars:
+            self.omitted += 1
+            return
+        self._parts.append(text)
+        self._length += len(text)
+
+    def build(self, suffix=''):
+        """返回最终的正文，suffix 紧跟在明细之后、省略提示之前"""
+        if self.omitted:
+            return ''.join(self._parts) + suffix + self.note.format(omitted=self.omitted, rows=self.rows)
+        return ''.join(self._parts) + suffix
+
+
+# 常用列在告警邮件中显示的名称
+COLUMN_LABELS = {
+    'JOB_NAME': '作业名称',
+    'JOB_RESULT_LOG': '错误日志',
+}
+
+
+# 模板中条件字段的占位符名称，其余占位符为查询列名
+STATUS_FIELD = 'STATUS'
+# 超长日志打包后的附件名称
+ATTACHMENT_NAME = 'job_logs.txt.gz'
+
+
+class CompiledTemplate:
+    """预编译的明细模板
+
+    模板使用 {列名} 占位符（条件字段的值为 {STATUS}），编译时拆分为固定文本和字段名，
+    每行渲染只做一次顺序拼接，不再重复解析模板。
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self._parts = []
+        for literal, field_name, format_spec, conversion in string.Formatter().parse(source):
+            if field_name == '' or format_spec or conversion:
+                raise ValueError(f"模板占位符只能是列名，例如 {{JOB_NAME}}: {source!r}")
+            self._parts.append((literal, field_name))
+        self.fields = tuple(field_name for _, field_name in self._parts if field_name is not None)
+
+    def render(self, values):
+        out = []
+        for literal, field_name in self._parts:
+            out.append(literal)
+            if field_name is not None:
+                out.append(values[field_name])
+        return ''.join(out)
+
+
+@lru_cache(maxsize=128)
+def compile_template(source):
+    """编译模板，相同的模板文本只编译一次"""
+    return CompiledTemplate(source)
+
+
+def default_text_row(columns):
+    """默认的纯文本明细模板：每列一行 "名称: 值"，作业状态紧跟在第一列之后，最后是分隔线"""
+    lines = [f"{COLUMN_LABELS.get(columns[0], columns[0])}: {{{columns[0]}}}\n",
+             f"作业状态: {{{STATUS_FIELD}}}\n"]
+    lines.extend(f"{COLUMN_LABELS.get(column, column)}: {{{column}}}\n" for column in columns[1:])
+    lines.append("-" * 50 + "\n")
+    return ''.join(lines)
+
+
+def default_html_row(columns):
+    """HTML表格的明细行模板，列顺序与 default_text_row 相同"""
+    fields = [columns[0], STATUS_FIELD, *columns[1:]]
+    cells = ''.join(f'<td style="white-space:pre-wrap">{{{field}}}</td>' for field in fields)
+    return f"<tr>{cells}</tr>\n"
+
+
+def _html_text(text):
+    return html.escape(text).replace('\n', '<br>\n')
+
+
+class RenderedAlert:
+    """渲染完成的告警：纯文本正文、可选的HTML正文以及附件
+
+    MIME 正文部分在第一次发送时构建并缓存，同一告警发给多组收件人时不再重复编码。
+    str() 返回纯文本正文，汇总发送等只需要文本的地方可以直接使用。
+    """
+
+    def __init__(self, text, html=None, attachments=()):
+        self.text = text
+        self.html = html
+        self.attachments = list(attachments)
+        self._parts = None
+
+    def __str__(self):
+        return self.text
+
+    def _mime_parts(self):
+        if self._parts is None:
+            if self.html is not None:
+                body = MIMEMultipart('alternative')
+                body.attach(MIMEText(self.text, 'plain', 'utf-8'))
+                body.attach(MIMEText(self.html, 'html', 'utf-8'))
+            else:
+                body = MIMEText(self.text, 'plain')
+            parts = [body]
+            for filename, data in self.attachments:
+                part = MIMEApplication(data, 'gzip')
+                part.add_header('Content-Disposition', 'attachment', filename=filename)
+                parts.append(part)
+            self._parts = parts
+        return self._parts
+
+    def to_message(self, sender, receivers, subject):
+        message = MIMEMultipart()
+        message["From"] = sender
+        message["To"] = ', '.join(receivers)
+        message["Subject"] = subject
+        for part in self._mime_parts():
+            message.attach(part)
+        return message
+
+
+def build_message(sender, receivers, subject, body):
+    """构建邮件，body 可以是字符串或 RenderedAlert"""
+    if not isinstance(body, RenderedAlert):
+        body = RenderedAlert(body)
+    return body.to_message(sender, receivers, subject)
+
+
+class AlertRenderer:
+    """按模板渲染告警邮件
+
+    - 明细模板在创建时编译并校验，之后每次检查重复使用
+    - 可选输出HTML表格，与纯文本一起作为 multipart/alternative 发送
+    - 单个字段超过 max_field_chars 时截断；日志列超过 attach_log_chars 时正文中只保留开头，
+      完整日志打包为gzip附件（压缩前的UTF-8字节数不超过 max_attachment_bytes），
+      attach_log_chars 为 0 时不使用附件
+    - 正文总长度受 max_chars 限制，超出后只统计行数
+    """
+
+    def __init__(self, columns, text_row=None, html_row=None, html_enabled=False,
+                 log_column='JOB_RESULT_LOG', max_chars=200000, max_field_chars=4000,
+                 attach_log_chars=0, max_attachment_bytes=5 * 1024 * 1024):
+        self.columns = tuple(columns)
+        self.text_row = compile_template(text_row or default_text_row(self.columns))
+        self.html_row = None
+        if html_enabled or html_row:
+            self.html_row = compile_template(html_row or default_html_row(self.columns))
+        allowed = set(self.columns) | {STATUS_FIELD}
+        for template in (self.text_row, self.html_row):
+            unknown = set(template.fields) - allowed if template is not None else set()
+            if unknown:
+                raise ValueError(f"模板中的字段不在查询列中: {', '.join(sorted(unknown))}")
+        self.log_column = log_column
+        self.max_chars = max_chars
+        self.max_field_chars = max_field_chars
+        self.attach_log_chars = attach_log_chars
+        self.max_attachment_bytes = max_attachment_bytes
+        labels = [COLUMN_LABELS.get(self.columns[0], self.columns[0]), '作业状态']
+        labels.extend(COLUMN_LABELS.get(column, column) for column in self.columns[1:])
+        self.html_head = '<tr>' + ''.join(f'<th>{html.escape(label)}</th>' for label in labels) + '</tr>\n'
+
+    def begin(self, header):
+        """开始一封告警邮件"""
+        return AlertDocument(self, header)
+
+
+class AlertDocument:
+    """一次检查的告警内容，逐行追加，最后通过 build() 生成 RenderedAlert"""
+
+    def __init__(self, renderer, header):
+        self.renderer = renderer
+        self.text = _BoundedBody(header, renderer.max_chars)
+        self.html = None
+        if renderer.html_row is not None:
+            self.html = _BoundedBody(
+                f'<html><body>\n<p>{_html_text(header.strip())}</p>\n'
+                f'<table border="1" cellspacing="0" cellpadding="4">\n{renderer.html_head}',
+                renderer.max_chars,
+                note="<p>... 另有 {omitted} 条记录因正文长度限制未显示（共 {rows} 条）</p>\n",
+            )
+        self._notes = []
+        self._attachment = []
+        self._attachment_size = 0
+
+    @property
+    def rows(self):
+        return self.text.rows
+
+    def _attach(self, job_name, status, log):
+        entry = f"===== {job_name} ({status}) =====\n{log}\n\n".encode('utf-8')
+        if self._attachment_size + len(entry) > self.renderer.max_attachment_bytes:
+            return False
+        self._attachment.append(entry)
+        self._attachment_size += len(entry)
+        return True
+
+    def _field_values(self, status, values):
+        renderer = self.renderer
+        fields = {STATUS_FIELD: str(status)}
+        for column, value in zip(renderer.columns, values):
+            # max_log_chars = 0 时日志列以 LOB 对象返回，读取完整内容
+            text = value.read() if hasattr(value, 'read') else str(value)
+            if (column == renderer.log_column and renderer.attach_log_chars
+                    and len(text) > renderer.attach_log_chars):
+                if self._attach(values[0], status, text):
+                    text = text[:renderer.attach_log_chars] + f" ...（完整日志见附件 {ATTACHMENT_NAME}）"
+                else:
+                    text = text[:renderer.attach_log_chars] + " ...（已截断）"
+            elif renderer.max_field_chars and len(text) > renderer.max_field_chars:
+                text = text[:renderer.max_field_chars] + " ...（已截断）"
+            fields[column] = text
+        return fields
+
+    def add_row(self, status, values):
+        """追加一行明细，values 与 renderer.columns 一一对应"""
+        if self.text.omitted and (self.html is None or self.html.omitted):
+            # 正文已达上限，只计数，不再渲染
+            self.text.add_row('')
+            if self.html is not None:
+                self.html.add_row('')
+            return
+        fields = self._field_values(status, values)
+        self.text.add_row(self.renderer.text_row.render(fields))
+        if self.html is not None:
+            self.html.add_row(self.renderer.html_row.render(
+                {name: html.escape(value) for name, value in fields.items()}))
+
+    def add_note(self, text):
+        """在明细之后追加一段说明（例如恢复通知）"""
+        self._notes.append(text)
+
+    def build(self):
+        # 没有明细时（例如只有恢复通知）不输出标题和表格
+        notes = ''.join(self._notes)
+        text = self.text.build() + notes if self.rows else notes.lstrip('\n')
+        html_body = None
+        if self.html is not None:
+            notes = ''.join(f"<p>{_html_text(note.strip())}</p>\n" for note in self._notes)
+            table = self.html.build('</table>\n') if self.rows else '<html><body>\n'
+            html_body = table + notes + '</body></html>\n'
+        attachments = []
+        if self._attachment:
+            attachments.append((ATTACHMENT_NAME, gzip.compress(b''.join(self._attachment))))
+        return RenderedAlert(text, html_body, attachments)
+
+
+def _truthy(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def _read_template(path):
+    if not path:
+        return None
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def create_renderer(columns, options):
+    """根据监控目标的配置创建渲染器，模板文件在此时读取并编译"""
+    return AlertRenderer(
+        columns,
+        text_row=_read_template(options.get('text_template')),
+        html_row=_read_template(options.get('html_template')),
+        html_enabled=_truthy(options.get('html', 'false')),
+        log_column=options.get('log_column', 'JOB_RESULT_LOG'),
+        max_chars=int(options.get('max_body_chars', 200000)),
+        max_field_chars=int(options.get('max_field_chars', 4000)),
+        attach_log_chars=int(options.get('attach_log_chars', 0)),
+        max_attachment_bytes=int(options.get('max_attachment_bytes', 5 * 1024 * 1024)),
+    )
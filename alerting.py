@@ -0,0 +1,203 @@
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def alert_key(table_name, job_name, status):
+    """告警状态的键：(表名, 作业名称, 作业状态)"""
+    return f"{table_name}|{job_name}|{status}"
+
+
+class AlertCycle:
+    """单个监控目标一轮检查中的告警判断
+
+    用法：
+        cycle = engine.begin(target_name)
+        for row in rows:
+            if cycle.should_alert(key): ...   # 新告警或已超过抑制窗口
+        resolved = cycle.resolved()           # 本轮不再满足条件的告警
+        ... 发送邮件 ...
+        cycle.commit(notified=True)
+    """
+
+    def __init__(self, engine, target_name, previous, now):
+        self.engine = engine
+        self.target_name = target_name
+        self.now = now
+        self._previous = previous
+        self._current = {}
+        self._alerted = set()
+        self.suppressed = 0
+
+    def should_alert(self, key):
+        """记录本轮出现的告警，返回是否需要发送通知"""
+        state = self._previous.get(key)
+        if state is None:
+            self._current[key] = {'first_seen': self.now, 'last_notified': None}
+            self._alerted.add(key)
+            return True
+        self._current[key] = dict(state)
+        last = state.get('last_notified')
+        if last is None or self.now - last >= self.engine.suppress_seconds:
+            self._alerted.add(key)
+            return True
+        self.suppressed += 1
+        return False
+
+    def resolved(self):
+        """返回上一轮处于告警状态、本轮已不再出现的键（只有全量查询时才有意义）"""
+        return [key for key in self._previous if key not in self._current]
+
+    def commit(self, notified, partial=False):
+        """保存本轮状态；notified 为 False 时不更新通知时间，下一轮会再次尝试通知
+
+        partial 为 True 表示本轮结果不完整（例如达到 max_rows 上限），
+        本轮未出现的告警保留原有状态，避免其抑制窗口被清除后重复告警。
+        """
+        if notified:
+            for key in self._alerted:
+                self._current[key]['last_notified'] = self.now
+        if partial:
+            for key, state in self._previous.items():
+                self._current.setdefault(key, state)
+        self.engine._save(self.target_name, self._current)
+
+
+class AlertEngine:
+    """告警状态引擎：同一 (表, 作业, 状态) 在 suppress_seconds 内只通知一次
+
+    状态保存在 StateStore 中，重启后继续生效。suppress_seconds 为0时每轮都通知（原有行为）。
+    """
+
+    def __init__(self, store, suppress_seconds=3600, notify_resolved=True):
+        self.store = store
+        self.suppress_seconds = suppress_seconds
+        self.notify_resolved = notify_resolved
+
+    def begin(self, target_name):
+        previous = self.store.get_value(target_name, 'alerts', {})
+        return AlertCycle(self, target_name, previous, time.time())
+
+    def _save(self, target_name, current):
+        self.store.set_value(target_name, 'alerts', current)
+
+
+class RecipientRateLimiter:
+    """按收件人限制单位时间内的告警邮件数量"""
+
+    def __init__(self, max_per_window=30, window_seconds=3600):
+        self.max_per_window = max_per_window
+        self.window_seconds = window_seconds
+        self._sent = {}
+        self._lock = threading.Lock()
+
+    def allow(self, receivers):
+        """返回本次允许发送的收件人，并记录发送次数；max_per_window 为0时不限制"""
+        if not self.max_per_window:
+            return list(receivers)
+        now = time.monotonic()
+        allowed = []
+        with self._lock:
+            for receiver in receivers:
+                history = self._sent.setdefault(receiver, deque())
+                while history and now - history[0] > self.window_seconds:
+                    history.popleft()
+                if len(history) < self.max_per_window:
+                    history.append(now)
+                    allowed.append(receiver)
+        blocked = len(receivers) - len(allowed)
+        if blocked:
+            logger.warning(f"{blocked} 个收件人超过告警频率限制，本次不发送")
+        return allowed
+
+
+class DigestBuffer:
+    """汇总模式：把多个监控目标的告警按收件人合并，每 interval 秒发送一封"""
+
+    def __init__(self, send_func, interval=900, subject='数据库监控告警汇总'):
+        self.send_func = send_func
+        self.interval = interval
+        self.subject = subject
+        self._sections = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def add(self, receivers, title, body):
+        with self._lock:
+            self._sections.setdefault(tuple(receivers), []).append(f"【{title}】\n{body}")
+
+    def flush(self):
+        with self._lock:
+            sections, self._sections = self._sections, {}
+        for receivers, parts in sections.items():
+            subject = f"{self.subject}（{len(parts)} 项）"
+            try:
+                self.send_func(subject, ("\n" + "=" * 50 + "\n").join(parts), list(receivers))
+            except Exception as e:
+                logger.error(f"发送汇总告警失败: {str(e)}")
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.flush()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='alert-digest', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+class AlertManager:
+    """组合告警状态、收件人限流和汇总发送"""
+
+    def __init__(self, engine, limiter=None, digest=None):
+        self.engine = engine
+        self.limiter = limiter
+        self.digest = digest
+
+    def deliver(self, send_func, subject, body, receivers):
+        """按限流和汇总设置投递告警，返回是否已发送或已放入汇总"""
+        if self.limiter is not None:
+            receivers = self.limiter.allow(receivers)
+            if not receivers:
+                return False
+        if self.digest is not None:
+            self.digest.add(receivers, subject, body)
+            return True
+        send_func(subject, body, receivers)
+        return True
+
+    def close(self):
+        if self.digest is not None:
+            self.digest.stop()
+
+
+def create_alert_manager(alert_config, store, send_func):
+    """根据 [ALERT] 配置创建告警管理器，没有该配置段时返回None（保持每轮都告警的原有行为）"""
+    if alert_config is None:
+        return None
+    engine = AlertEngine(
+        store,
+        suppress_seconds=float(alert_config.get('suppress_seconds', 3600)),
+        notify_resolved=str(alert_config.get('notify_resolved', 'true')).lower() in ('1', 'true', 'yes', 'on'),
+    )
+    limiter = None
+    if int(alert_config.get('recipient_max_per_hour', 0)):
+        limiter = RecipientRateLimiter(int(alert_config.get('recipient_max_per_hour')), 3600)
+    digest = None
+    if float(alert_config.get('digest_interval', 0)) > 0:
+        digest = DigestBuffer(
+            send_func,
+            interval=float(alert_config.get('digest_interval')),
+            subject=alert_config.get('digest_subject', '数据库监控告警汇总'),
+        )
+        digest.start()
+    return AlertManager(engine, limiter, digest)
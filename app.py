@@ -1,62 +1,128 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, g, Response, stream_with_context
+import json
+import time
 import smtplib
-import configparser
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import ssl
 from flask_cors import CORS
 import os
 import logging
 import sys
+from contextlib import ExitStack
+from smtp_client import SMTPClient, SMTPClientPool, SMTPPoolTimeout
+from settings import ConfigWatcher, SMTP_REQUIRED
+from log_pipeline import (setup_logging, configure_levels, correlation, new_correlation_id,
+                          bind_correlation, reset_correlation)
+from metrics import REGISTRY, CONTENT_TYPE, HTTP_REQUEST_SECONDS, EMAILS_SENT, EMAILS_FAILED
 
-# 设置更详细的日志记录
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+# 读取配置文件（路径查找和环境变量覆盖与监控程序共用 settings 模块）
+config_watcher = ConfigWatcher(required=SMTP_REQUIRED)
+config = config_watcher.current
+
+# 非阻塞日志：请求线程只把日志放入队列，由后台线程输出到控制台（[LOGGING] file 可另写文件）；
+# 默认级别为 [WEB] log_level（环境变量 LOG_LEVEL），各模块的级别在 [LOGGING] 中设置
+logging_pipeline = setup_logging(config.section('LOGGING'),
+                                 default_level=config.get('WEB', 'log_level', 'INFO'))
+
 app = Flask(__name__)
 CORS(app)
 
 logger.info("Starting application initialization...")
+logger.info(f"Read config file from: {os.path.abspath(config.path)}")
+
+def apply_web_settings(config):
+    """应用 [WEB] 段中可以热加载的设置"""
+    global web_config, bulk_max_messages
+    web_config = config.section('WEB')
+    configure_levels(config.section('LOGGING'), web_config.get('log_level', 'INFO'))
+    bulk_max_messages = config.getint('WEB', 'bulk_max_messages', 1000)
+
+def create_smtp_pool(config):
+    """进程内共享的SMTP长连接池，多个请求线程复用已登录的会话"""
+    smtp_config = config['SMTP']
+    debuglevel = 1 if config.getboolean('WEB', 'smtp_debug') else 0
+    return SMTPClientPool(
+        lambda: SMTPClient.from_config(smtp_config, debuglevel=debuglevel),
+        size=config.getint('WEB', 'smtp_connections', 4),
+        acquire_timeout=float(config.get('WEB', 'smtp_acquire_timeout', 30)),
+    )
+
+apply_web_settings(config)
+smtp_pool = create_smtp_pool(config)
+
+# 启用发件队列时，接口只负责入队并立即返回，由后台线程投递（未配置时不导入sqlite3）
+mail_queue, mail_dispatcher = None, None
+if config.has_section('MAIL_QUEUE'):
+    from mail_queue import create_mail_queue
+    mail_queue, mail_dispatcher = create_mail_queue(
+        config['MAIL_QUEUE'],
+        lambda: SMTPClient.from_config(config_watcher.current['SMTP']),
+    )
+
+def on_config_change(old, new):
+    """配置文件修改后无需重启：更新Web设置，SMTP设置变化时切换到新的连接池"""
+    global config, smtp_pool
+    config = new
+    apply_web_settings(new)
+    smtp_keys = ('smtp_debug', 'smtp_connections')
+    if (dict(old.section('SMTP')) != dict(new.section('SMTP'))
+            or any(old.get('WEB', key) != new.get('WEB', key) for key in smtp_keys)):
+        # 旧池关闭后，正在使用的旧连接在请求结束归还时断开
+        old_pool, smtp_pool = smtp_pool, create_smtp_pool(new)
+        old_pool.close()
+        logger.info("SMTP configuration changed, switched to a new connection pool")
+    if dict(old.section('MAIL_QUEUE')) != dict(new.section('MAIL_QUEUE')):
+        logger.warning("Changes to [MAIL_QUEUE] take effect after restart")
 
-# 读取配置文件
-config = configparser.ConfigParser()
-
-# 获取脚本所在目录（考虑PyInstaller打包情况）
-if getattr(sys, 'frozen', False):
-    # 如果是打包后的EXE
-    application_path = os.path.dirname(sys.executable)
-    config_path = os.path.join(application_path, 'config.ini')
-    
-    # 如果外部没有配置文件，则尝试从打包资源中获取
-    if not os.path.exists(config_path):
-        bundle_dir = getattr(sys, '_MEIPASS', os.path.abspath(os.path.dirname(__file__)))
-        config_path = os.path.join(bundle_dir, 'config.ini')
-else:
-    # 普通Python脚本运行
-    config_path = 'config.ini'
-
-logger.info(f"Attempting to read config file from: {os.path.abspath(config_path)}")
-config.read(config_path, encoding='utf-8')
-
-# 获取邮件配置
-smtp_server = os.environ.get('SMTP_SERVER') or config['SMTP']['server']
-smtp_port = int(os.environ.get('SMTP_PORT') or config['SMTP']['port'])
-smtp_username = os.environ.get('SMTP_USERNAME') or config['SMTP']['username']
-smtp_password = os.environ.get('SMTP_PASSWORD') or config['SMTP']['password']
-sender_email = os.environ.get('SENDER_EMAIL') or config['SMTP']['sender_email']
+config_watcher.add_listener(on_config_change)
+# 每 reload_interval 秒检查一次配置文件，0 表示关闭热加载
+config_watcher.interval = config.getfloat('WEB', 'reload_interval', 5)
+if config_watcher.interval > 0:
+    config_watcher.start()
 
 logger.info(f"Configuration loaded successfully")
-logger.debug(f"SMTP Server: {smtp_server}")
-logger.debug(f"SMTP Port: {smtp_port}")
-logger.debug(f"Username: {smtp_username}")
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    # 每个请求一个关联ID，可由调用方通过 X-Request-ID 传入
+    g.request_id = request.headers.get('X-Request-ID', '')[:64] or new_correlation_id('req')
+    g.correlation_token = bind_correlation(g.request_id)
+
+@app.after_request
+def record_request_time(response):
+    start = getattr(g, 'request_start', None)
+    if start is not None and request.endpoint:
+        HTTP_REQUEST_SECONDS.labels(endpoint=request.endpoint, status=response.status_code).observe(
+            time.perf_counter() - start)
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@app.teardown_request
+def clear_correlation(exc=None):
+    token = g.pop('correlation_token', None)
+    if token is not None:
+        reset_correlation(token)
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
 
 @app.route('/')
 def serve_html():
     return send_from_directory('.', 'index.html')
 
+def build_message(receiver_email, subject, body):
+    message = MIMEMultipart()
+    message["From"] = config['SMTP']['sender_email']
+    message["To"] = receiver_email
+    message["Subject"] = subject
+    message.attach(MIMEText(body, "plain"))
+    return message
+
 @app.route('/send_email', methods=['POST'])
 def send_email():
     try:
@@ -64,72 +130,129 @@ def send_email():
         subject = request.form['subject']
         body = request.form['body']
 
-        logging.debug(f"SMTP Server: {smtp_server}")
-        logging.debug(f"SMTP Port: {smtp_port}")
-        logging.debug(f"SMTP Username: {smtp_username}")
-        logging.debug(f"Sender Email: {sender_email}")
-
-        message = MIMEMultipart()
-        message["From"] = sender_email
-        message["To"] = receiver_email
-        message["Subject"] = subject
-        message.attach(MIMEText(body, "plain"))
-
-        logging.info(f"Connecting to SMTP server: {smtp_server}:{smtp_port}")
-        
-        context = ssl.create_default_context()
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-        
-        logging.debug(f"Attempting to connect to {smtp_server}:{smtp_port}")
-        if smtp_port == 465:
-            # Use SSL
-            logging.debug("Using SSL connection")
-            with smtplib.SMTP_SSL(smtp_server, smtp_port, context=context) as server:
-                logging.debug("SSL connection established")
-                server.login(smtp_username, smtp_password)
-                logging.debug("Login successful")
-                server.sendmail(sender_email, receiver_email, message.as_string())
-                logging.debug("Email sent successfully")
-        else:
-            # Use TLS
-            logging.debug("Using TLS connection")
-            with smtplib.SMTP(smtp_server, smtp_port) as server:
-                server.set_debuglevel(1)
-                logging.debug("Connection established")
-                server.ehlo()
-                if server.has_extn('STARTTLS'):
-                    logging.debug("STARTTLS supported, initiating")
-                    server.starttls(context=context)
-                    server.ehlo()
-                else:
-                    logging.warning("STARTTLS not supported by the server")
-                server.login(smtp_username, smtp_password)
-                logging.debug("Login successful")
-                server.sendmail(sender_email, receiver_email, message.as_string())
-                logging.debug("Email sent successfully")
-        
-        logging.info("Email sent successfully")
+        message = build_message(receiver_email, subject, body)
+
+        if mail_queue is not None:
+            item_id = mail_queue.enqueue(message, [receiver_email])
+            logger.info(f"Email {item_id} queued for delivery")
+            return jsonify({'message': '邮件已加入发送队列', 'category': 'success', 'id': item_id}), 202
+
+        # 复用已登录的SMTP会话，连接失效时自动重连
+        smtp_pool.send_message(message, [receiver_email])
+
+        EMAILS_SENT.labels(source='web').inc()
+        logger.info("Email sent successfully")
         return jsonify({'message': '邮件发送成功!', 'category': 'success'}), 200
     except smtplib.SMTPAuthenticationError as e:
-        logging.error(f"Authentication failed: {str(e)}")
+        EMAILS_FAILED.labels(source='web').inc()
+        logger.error(f"Authentication failed: {str(e)}")
         return jsonify({'message': '认证失败，请检查用户名和密码', 'category': 'error'}), 400
+    except SMTPPoolTimeout as e:
+        logger.warning(f"SMTP pool busy: {str(e)}")
+        return jsonify({'message': '邮件服务繁忙，请稍后重试', 'category': 'error'}), 503
     except Exception as e:
         if str(e) == "(-1, b'\\x00\\x00\\x00')":
-            logging.warning("Received unexpected response from server, but email likely sent successfully")
+            logger.warning("Received unexpected response from server, but email likely sent successfully")
+            EMAILS_SENT.labels(source='web').inc()
             return jsonify({'message': '邮件可能已成功发送', 'category': 'success'}), 200
-        logging.error(f"Unexpected error: {str(e)}", exc_info=True)
+        EMAILS_FAILED.labels(source='web').inc()
+        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
         return jsonify({'message': '发送邮件时出错，请稍后重试', 'category': 'error'}), 500
 
+@app.route('/send_email/<int:item_id>', methods=['GET'])
+def send_email_status(item_id):
+    if mail_queue is None:
+        return jsonify({'message': '未启用发件队列', 'category': 'error'}), 404
+    status = mail_queue.status(item_id)
+    if status is None:
+        return jsonify({'message': '邮件不存在', 'category': 'error'}), 404
+    return jsonify(status), 200
+
+@app.route('/send_bulk', methods=['POST'])
+def send_bulk():
+    """批量发送邮件
+
+    请求体为 JSON：{"messages": [{"receiver_email": ..., "subject": ..., "body": ...}, ...]}
+    响应为逐行输出的 JSON（application/x-ndjson），每封邮件处理完立即输出一行状态。
+    """
+    payload = request.get_json(silent=True) or {}
+    messages = payload.get('messages')
+    if not isinstance(messages, list) or not messages:
+        return jsonify({'message': '请求体必须包含非空的 messages 列表', 'category': 'error'}), 400
+    if len(messages) > bulk_max_messages:
+        return jsonify({'message': f'单次最多发送 {bulk_max_messages} 封邮件', 'category': 'error'}), 413
+
+    request_id = g.request_id
+
+    def generate():
+        sent = failed = 0
+        # 响应流在请求处理函数返回后才逐行生成，需要重新设置关联ID
+        with correlation(cid=request_id), ExitStack() as stack:
+            client = None
+            if mail_queue is None:
+                # 只有直接发送时才占用SMTP会话，整批邮件使用同一个会话
+                try:
+                    client = stack.enter_context(smtp_pool.acquire())
+                except SMTPPoolTimeout as e:
+                    logger.warning(f"Bulk send rejected, SMTP pool busy: {str(e)}")
+                    yield json.dumps({'done': True, 'ok': 0, 'failed': len(messages),
+                                      'message': '邮件服务繁忙，请稍后重试'}, ensure_ascii=False) + '\n'
+                    return
+            for index, item in enumerate(messages):
+                result = {'index': index}
+                try:
+                    receiver_email = item['receiver_email']
+                    message = build_message(receiver_email, item['subject'], item['body'])
+                    receivers = [email.strip() for email in receiver_email.split(',')]
+                    if mail_queue is not None:
+                        result.update(status='queued', id=mail_queue.enqueue(message, receivers))
+                    else:
+                        client.send_message(message, receivers)
+                        EMAILS_SENT.labels(source='web').inc()
+                        result['status'] = 'sent'
+                    sent += 1
+                except Exception as e:
+                    EMAILS_FAILED.labels(source='web').inc()
+                    failed += 1
+                    result.update(status='error', message=str(e))
+                yield json.dumps(result, ensure_ascii=False) + '\n'
+            logger.info(f"Bulk send finished: {sent} ok, {failed} failed")
+        yield json.dumps({'done': True, 'ok': sent, 'failed': failed}) + '\n'
+
+    return Response(stream_with_context(generate()), content_type='application/x-ndjson')
+
+def serve(host='0.0.0.0', port=8080, server=None, threads=None):
+    """启动Web服务
+
+    server 为 waitress 时使用多线程的生产级WSGI服务器（需要 pip install waitress），
+    为 dev 时使用Flask自带的开发服务器。多进程部署请使用 gunicorn：
+        gunicorn -w 4 --threads 8 -b 0.0.0.0:8080 app:app
+    """
+    server = server or web_config.get('server', 'waitress')
+    threads = threads or int(web_config.get('threads', 8))
+    if server == 'waitress':
+        try:
+            from waitress import serve as waitress_serve
+        except ImportError:
+            logger.warning("未安装 waitress，改用Flask开发服务器（pip install waitress）")
+        else:
+            logger.info(f"Starting waitress on {host}:{port} with {threads} threads")
+            waitress_serve(app, host=host, port=port, threads=threads)
+            return
+    debug = str(web_config.get('debug', 'false')).lower() in ('1', 'true', 'yes', 'on')
+    app.run(debug=debug, host=host, port=port, threaded=True, use_reloader=False)
+
 if __name__ == '__main__':
     try:
+        host = web_config.get('host', '0.0.0.0')
+        port = config.getint('WEB', 'port', 8080)
         logger.info("Starting Flask application...")
         print("="*50)
         print("Application is starting...")
-        print("URL: http://localhost:8080")
+        print(f"URL: http://localhost:{port}")
         print("Press CTRL+C to quit")
         print("="*50)
-        app.run(debug=True, host='0.0.0.0', port=8080, use_reloader=False)
+        serve(host, port)
     except Exception as e:
         logger.error(f"Failed to start application: {str(e)}")
         print(f"Error starting application: {str(e)}")
@@ -0,0 +1,302 @@
+import signal
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from alert_render import build_message
+from backoff import Backoff
+from log_pipeline import correlation
+from metrics import CHECK_SECONDS, CHECK_FAILURES, EMAILS_SENT, EMAILS_FAILED
+from monitor_scheduler import TargetStats, AdaptiveInterval
+from smtp_client import SMTPClient, create_ssl_context
+
+try:
+    import aiosmtplib
+except ImportError:  # 可选依赖，未安装时在线程池中使用同步的 SMTPClient
+    aiosmtplib = None
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMonitorScheduler:
+    """基于 asyncio 的多目标调度器
+
+    每个目标是一个协程任务，按绝对时间点调度（下一次 = 上一次计划时间 + 检查间隔，
+    启用 adaptive_interval 时间隔由 AdaptiveInterval 调整），
+    检查耗时不会让间隔逐渐漂移；错过的时间点直接跳过，不会堆积。
+    阻塞的数据库调用在有界线程池中执行，调度本身只占用一个线程。
+    stop() 或收到 SIGINT/SIGTERM 后立即取消所有等待中的任务，不必等完整个检查间隔。
+    """
+
+    def __init__(self, targets, check_func, max_workers=4, retry_interval=60, shutdown_timeout=30,
+                 services=()):
+        if not targets:
+            raise ValueError("没有配置任何监控目标")
+        self.targets = list(targets)
+        self.check_func = check_func
+        self.max_workers = max_workers
+        self.retry_interval = retry_interval
+        self.shutdown_timeout = shutdown_timeout
+        # 随事件循环启动和关闭的服务，需提供 async start(loop) 和 async close()
+        self.services = list(services)
+        self.backoff = Backoff(base_delay=1.0, max_delay=retry_interval)
+        self._stats = {target.name: TargetStats() for target in self.targets}
+        self._intervals = {target.name: AdaptiveInterval() for target in self.targets}
+        self._loop = None
+        self._stop_event = None
+        self._executor = None
+        self._wakeups = {}
+        self._tasks = {}
+        self._targets = {target.name: target for target in self.targets}
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def latency_snapshot(self):
+        """返回每个目标的耗时统计，键为目标名称"""
+        return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+    def stop(self):
+        """请求停止，可以从任意线程调用"""
+        if self._loop is not None and self._stop_event is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+
+    def update_targets(self, targets):
+        """替换监控目标（配置重新加载后调用），可以从任意线程调用"""
+        targets = list(targets)
+        if self._loop is None:
+            self.targets = targets
+            self._targets = {target.name: target for target in targets}
+            return
+        self._loop.call_soon_threadsafe(self._apply_targets, targets)
+
+    def _apply_targets(self, targets):
+        names = {target.name for target in targets}
+        for name in list(self._tasks):
+            if name not in names:
+                logger.info(f"监控目标 {name} 已从配置中删除")
+                self._tasks.pop(name).cancel()
+        self.targets = targets
+        # 各目标的协程每轮从这里读取最新的配置
+        self._targets = {target.name: target for target in targets}
+        for target in targets:
+            if target.name not in self._tasks:
+                self._stats.setdefault(target.name, TargetStats())
+                self._intervals.setdefault(target.name, AdaptiveInterval())
+                self._wakeups[target.name] = asyncio.Event()
+                self._start_task(target.name)
+
+    def trigger(self, names):
+        """收到数据变更通知后立即检查指定目标，可以从任意线程调用"""
+        if self._loop is None:
+            return
+        for name in names:
+            wakeup = self._wakeups.get(name)
+            if wakeup is not None:
+                self._loop.call_soon_threadsafe(wakeup.set)
+
+    def _start_task(self, name, delay=0):
+        task = asyncio.ensure_future(self._run_target(name, delay))
+        task.add_done_callback(functools.partial(self._on_task_done, name))
+        self._tasks[name] = task
+
+    def _on_task_done(self, name, task):
+        # 任务只会因取消而结束；异常退出时记录日志并重新启动，避免目标再也不被检查
+        if task.cancelled() or self._tasks.get(name) is not task:
+            return
+        logger.error(f"监控目标 {name} 的调度任务异常退出，{self.retry_interval} 秒后重新启动",
+                     exc_info=task.exception())
+        self._start_task(name, self.retry_interval)
+
+    async def _check_once(self, target, stats, adaptive, next_run):
+        """执行一次检查，返回 (下一次计划时间, 是否处于失败退避)"""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        error = None
+        matched = None
+        try:
+            # check_func 可以返回匹配的行数，用于调整检查间隔
+            matched = await loop.run_in_executor(self._executor, self.check_func, target)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = e
+            logger.error(f"监控目标 {target.name} 检查失败: {str(e)}", exc_info=True)
+        latency = loop.time() - start
+        stats.record(latency, error)
+        CHECK_SECONDS.labels(target=target.name).observe(latency)
+        logger.info(f"监控目标 {target.name} 检查完成，耗时 {latency:.3f} 秒")
+
+        now = loop.time()
+        if error is not None:
+            CHECK_FAILURES.labels(target=target.name).inc()
+            return now + self.backoff.delay(stats.consecutive_failures - 1), True
+        adaptive.record(latency, matched)
+        interval = adaptive.interval(target)
+        next_run += interval
+        if next_run <= now:
+            # 检查耗时超过了间隔，跳过错过的时间点
+            missed = int((now - next_run) // interval) + 1
+            next_run += missed * interval
+            logger.warning(f"监控目标 {target.name} 检查耗时超过间隔，跳过 {missed} 次")
+        return next_run, False
+
+    async def _run_target(self, name, delay=0):
+        loop = asyncio.get_running_loop()
+        stats = self._stats[name]
+        adaptive = self._intervals[name]
+        wakeup = self._wakeups[name]
+        if delay:
+            await asyncio.sleep(delay)
+        next_run = loop.time()
+        while True:
+            target = self._targets[name]
+            # 检查期间收到的通知会让下一次等待立即返回，多条通知合并为一次检查
+            wakeup.clear()
+            try:
+                next_run, backing_off = await self._check_once(target, stats, adaptive, next_run)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 统计、间隔计算等出错时同样按重试间隔继续调度，不能让任务结束
+                logger.error(f"监控目标 {name} 调度出错，{self.retry_interval} 秒后重试: {str(e)}",
+                             exc_info=True)
+                next_run, backing_off = loop.time() + self.retry_interval, True
+            now = loop.time()
+            if backing_off:
+                # 失败退避期间不响应推送通知
+                await asyncio.sleep(max(0.0, next_run - now))
+                continue
+            try:
+                await asyncio.wait_for(wakeup.wait(), next_run - now)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                # 被通知提前唤醒，之后的定时检查以本次为起点
+                next_run = loop.time()
+
+    def _install_signal_handlers(self):
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self._loop.add_signal_handler(sig, self._stop_event.set)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # Windows 或非主线程中不支持，依赖 KeyboardInterrupt / stop()
+                pass
+
+    async def run_async(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='monitor')
+        self._install_signal_handlers()
+        for service in self.services:
+            await service.start(self._loop)
+        logger.info(f"启动 asyncio 监控，共 {len(self.targets)} 个目标，数据库线程数 {self.max_workers}")
+        self._apply_targets(self.targets)
+        try:
+            await self._stop_event.wait()
+        finally:
+            tasks = list(self._tasks.values())
+            self._tasks.clear()
+            for task in tasks:
+                task.cancel()
+            # 等待正在执行的检查结束（线程中的数据库调用无法强制中断）
+            await asyncio.gather(*tasks, return_exceptions=True)
+            try:
+                await asyncio.wait_for(
+                    self._loop.run_in_executor(None, self._executor.shutdown, True),
+                    timeout=self.shutdown_timeout,
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"等待正在执行的检查超过 {self.shutdown_timeout} 秒，直接退出")
+            for service in self.services:
+                await service.close()
+            logger.info("asyncio 监控已停止")
+
+    def run(self):
+        """在当前线程中运行事件循环，直到调用 stop() 或收到终止信号"""
+        asyncio.run(self.run_async())
+
+
+class AsyncMailSender:
+    """在事件循环上发送邮件
+
+    安装了 aiosmtplib 时使用异步客户端，否则在线程池中使用同步的 SMTPClient 长连接。
+    send_threadsafe() 可以在执行检查的工作线程中调用，邮件I/O在事件循环上完成。
+    """
+
+    def __init__(self, smtp_config):
+        self.smtp_config = smtp_config
+        self.loop = None
+        self._client = None
+        self._lock = None
+
+    async def start(self, loop):
+        self.loop = loop
+        self._lock = asyncio.Lock()
+
+    def _build_message(self, subject, body, receivers):
+        return build_message(self.smtp_config['sender_email'], receivers, subject, body)
+
+    async def _send_aiosmtplib(self, message, receivers):
+        port = int(self.smtp_config['port'])
+        if self._client is None:
+            self._client = aiosmtplib.SMTP(
+                hostname=self.smtp_config['server'],
+                port=port,
+                use_tls=port == 465,
+                start_tls=False if port == 465 else None,
+                tls_context=create_ssl_context(),
+            )
+        if not self._client.is_connected:
+            await self._client.connect()
+            await self._client.login(self.smtp_config['username'], self.smtp_config['password'])
+        try:
+            await self._client.send_message(message, recipients=receivers)
+        except aiosmtplib.SMTPServerDisconnected:
+            logger.info("SMTP连接已断开，重新连接后重试")
+            await self._client.connect()
+            await self._client.login(self.smtp_config['username'], self.smtp_config['password'])
+            await self._client.send_message(message, recipients=receivers)
+
+    async def send(self, subject, body, receivers):
+        # 从工作线程提交时任务会继承检查的关联ID，发送日志挂在其后
+        with correlation('send'):
+            await self._send(subject, body, receivers)
+
+    async def _send(self, subject, body, receivers):
+        if isinstance(receivers, str):
+            receivers = [email.strip() for email in receivers.split(',')]
+        message = self._build_message(subject, body, receivers)
+        try:
+            async with self._lock:
+                if aiosmtplib is not None:
+                    await self._send_aiosmtplib(message, receivers)
+                else:
+                    if self._client is None:
+                        self._client = SMTPClient.from_config(self.smtp_config)
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, self._client.send_message, message, receivers)
+        except Exception as e:
+            EMAILS_FAILED.labels(source='monitor').inc()
+            logger.error(f"发送邮件失败: {str(e)}")
+            raise
+        EMAILS_SENT.labels(source='monitor').inc()
+        logger.info(f"邮件已成功发送到 {', '.join(receivers)}")
+
+    def send_threadsafe(self, subject, body, receivers):
+        """在工作线程中调用：把发送提交到事件循环并等待结果"""
+        return asyncio.run_coroutine_threadsafe(self.send(subject, body, receivers), self.loop).result()
+
+    async def close(self):
+        if self._client is None:
+            return
+        if aiosmtplib is not None:
+            try:
+                await self._client.quit()
+            except Exception:
+                pass
+        else:
+            self._client.close()
+        self._client = None
@@ -0,0 +1,19 @@
+import random
+
+
+class Backoff:
+    """带随机抖动的指数退避
+
+    第 n 次重试的等待时间在 [0, min(max_delay, base_delay * 2**n)] 之间随机选取，
+    避免多个线程或进程在同一时刻一起重连。
+    """
+
+    def __init__(self, base_delay=1.0, max_delay=30.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        """返回第 attempt 次（从0开始）重试前应等待的秒数"""
+        # 限制指数，长时间故障时重试次数很大也不会溢出
+        ceiling = min(self.max_delay, self.base_delay * (2 ** min(attempt, 62)))
+        return random.uniform(0, ceiling)
@@ -0,0 +1,199 @@
+import time
+import base64
+import threading
+import socketserver
+
+from db_drivers import ORACLE
+
+
+class FakeCursor:
+    """模拟 cx_Oracle 游标，返回合成的作业表数据
+
+    每次 execute 和每次 fetchmany 都会休眠 latency 秒，用来模拟一次网络往返。
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.arraysize = 100
+        self.prefetchrows = 2
+        self._remaining = 0
+        self._next = 0
+
+    def execute(self, query, params=None):
+        self.connection.executions += 1
+        self.connection.last_query = query
+        time.sleep(self.connection.latency)
+        self._remaining = self.connection.rows
+        self._next = 0
+        return self
+
+    def _make_row(self, i):
+        log = ('x' * self.connection.log_size)
+        if self.connection.max_log_chars is not None:
+            log = log[:self.connection.max_log_chars]
+        return ('Error', f'JOB_{i:06d}', log)
+
+    def fetchmany(self, size=None):
+        size = size or self.arraysize
+        count = min(size, self._remaining)
+        if count == 0:
+            return []
+        self.connection.round_trips += 1
+        time.sleep(self.connection.latency)
+        rows = [self._make_row(self._next + i) for i in range(count)]
+        self._next += count
+        self._remaining -= count
+        return rows
+
+    def fetchall(self):
+        rows = []
+        while True:
+            batch = self.fetchmany()
+            if not batch:
+                return rows
+            rows.extend(batch)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """模拟 cx_Oracle 连接
+
+    Args:
+        rows: 每次查询返回的行数
+        latency: 每次网络往返的延迟（秒）
+        log_size: 合成的 JOB_RESULT_LOG 长度
+        max_log_chars: 模拟数据库端截断后的长度，为None时返回完整日志
+    """
+
+    def __init__(self, rows=100, latency=0.0, log_size=200, max_log_chars=None):
+        self.rows = rows
+        self.latency = latency
+        self.log_size = log_size
+        self.max_log_chars = max_log_chars
+        self.executions = 0
+        self.round_trips = 0
+        self.last_query = None
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def ping(self):
+        time.sleep(self.latency)
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    """提供与 OraclePool 相同 acquire() 接口的替身"""
+
+    dialect = ORACLE
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def acquire(self):
+        pool = self
+
+        class _Lease:
+            def __enter__(self):
+                return pool.connection
+
+            def __exit__(self, *exc):
+                return False
+
+        return _Lease()
+
+    def close(self):
+        pass
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """极简的SMTP协议实现：接受任意登录，只统计收到的邮件"""
+
+    def _reply(self, line):
+        self.wfile.write((line + '\r\n').encode('ascii'))
+
+    def handle(self):
+        sink = self.server.sink
+        self._reply('220 localhost benchmark sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self._reply('250-localhost')
+                self._reply('250-AUTH PLAIN LOGIN')
+                self._reply('250 SIZE 52428800')
+            elif verb == 'HELO':
+                self._reply('250 localhost')
+            elif verb == 'AUTH':
+                parts = command.split()
+                if parts[1].upper() == 'LOGIN':
+                    if len(parts) < 3:
+                        self._reply('334 ' + base64.b64encode(b'Username:').decode())
+                        self.rfile.readline()
+                    self._reply('334 ' + base64.b64encode(b'Password:').decode())
+                    self.rfile.readline()
+                sink.logins += 1
+                self._reply('235 Authentication successful')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                size = 0
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b'.\r\n', b'.\n'):
+                        break
+                    size += len(data)
+                sink.record(size)
+                self._reply('250 OK')
+            elif verb == 'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                # MAIL、RCPT、NOOP、RSET 等命令直接应答成功
+                self._reply('250 OK')
+
+
+class _ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """在本地随机端口上运行的SMTP接收服务器，只统计邮件数量和大小"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self._server = _ThreadingServer((host, port), _SMTPHandler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address
+        self.messages = 0
+        self.bytes = 0
+        self.logins = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record(self, size):
+        with self._lock:
+            self.messages += 1
+            self.bytes += size
+
+    def start(self):
+        # 缩短轮询间隔，退出时 shutdown() 不必等待默认的0.5秒
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,235 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import configparser
+
+from benchmarks.fakes import FakeConnection, FakePool, SMTPSink
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(name, func, iterations):
+    """重复执行 func，返回吞吐量和 p50/p99 延迟"""
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+    latencies.sort()
+    result = {
+        'name': name,
+        'iterations': iterations,
+        'throughput': iterations / total if total else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+    print(f"{name:<28} {iterations:>6} 次  {result['throughput']:>10.1f} 次/秒  "
+          f"p50 {result['p50_ms']:>9.3f} ms  p99 {result['p99_ms']:>9.3f} ms")
+    return result
+
+
+def make_config(sink):
+    config = configparser.ConfigParser()
+    config['SMTP'] = {
+        'server': sink.host,
+        'port': str(sink.port),
+        'username': 'bench',
+        'password': 'bench',
+        'sender_email': 'bench@localhost',
+    }
+    config['MONITOR'] = {
+        'table_name': 'JOB_CONFIG',
+        'field_name': 'JOB_STATUS',
+        'condition_value': 'Error',
+        'receiver_email': 'ops@localhost',
+    }
+    return config
+
+
+def bench_query(monitor, args):
+    connection = FakeConnection(rows=args.rows, latency=args.db_latency, log_size=args.log_size)
+    measure('check_field_value', lambda: monitor.check_field_value(
+        connection, 'JOB_CONFIG', 'JOB_STATUS', 'Error'), args.iterations)
+
+    streamed = FakeConnection(rows=args.rows, latency=args.db_latency, log_size=args.log_size,
+                              max_log_chars=args.max_log_chars)
+
+    def stream():
+        for _ in monitor.iter_field_values(streamed, 'JOB_CONFIG', 'JOB_STATUS', 'Error',
+                                           max_log_chars=args.max_log_chars,
+                                           arraysize=args.arraysize):
+            pass
+
+    measure('iter_field_values', stream, args.iterations)
+
+
+def bench_render(args):
+    from alert_render import AlertRenderer
+    rows = [('Error', f'JOB_{i:06d}', 'x' * args.log_size) for i in range(args.rows)]
+    renderer = AlertRenderer(('JOB_NAME', 'JOB_RESULT_LOG'), html_enabled=True)
+
+    def render_template():
+        document = renderer.begin("检测到表 JOB_CONFIG 中以下作业状态为 Error：\n\n")
+        for status, job_name, log in rows:
+            document.add_row(status, (job_name, log))
+        document.build().to_message('bench@localhost', ['ops@localhost'], 'bench').as_string()
+
+    measure('render template (text+html)', render_template, args.iterations)
+
+
+def bench_check_target(monitor, args, config, sink):
+    from change_tracker import ChangeTracker
+    target = monitor.load_targets(config)[0]
+    pool = FakePool(FakeConnection(rows=args.rows, latency=args.db_latency,
+                                   log_size=args.log_size, max_log_chars=args.max_log_chars))
+    tracker = ChangeTracker(None, target.name)
+    measure('check_target (端到端)', lambda: monitor.check_target(config, pool, target, tracker),
+            args.iterations)
+
+
+def bench_sqlite(monitor, args, config, sink):
+    """通过 DB-API 驱动检查真实的 SQLite 作业表（端到端，包括连接池和语句缓存）"""
+    import sqlite3
+    import tempfile
+    from change_tracker import ChangeTracker
+    from settings import ConfigSnapshot
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'jobs.db')
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE JOB_CONFIG (JOB_NAME TEXT, JOB_STATUS TEXT, JOB_RESULT_LOG TEXT)")
+    db.executemany("INSERT INTO JOB_CONFIG VALUES (?, ?, ?)",
+                   ((f'JOB_{i:06d}', 'Error', 'x' * args.log_size) for i in range(args.rows)))
+    db.commit()
+    db.close()
+    sections = {name: dict(config[name]) for name in config.sections()}
+    sections['MONITOR']['database'] = 'staging'
+    sections['MONITOR']['max_log_chars'] = str(args.max_log_chars)
+    sections['DATABASE:staging'] = {'driver': 'sqlite', 'path': path}
+    snapshot = ConfigSnapshot(sections)
+    target = monitor.load_targets(snapshot)[0]
+    pool = monitor.create_pool(snapshot, 1, target.database)
+    tracker = ChangeTracker(None, target.name)
+    try:
+        measure('check_target (SQLite)', lambda: monitor.check_target(snapshot, pool, target, tracker),
+                args.iterations)
+    finally:
+        pool.close()
+
+
+def bench_send_email(monitor, args, config, sink):
+    body = 'x' * args.log_size
+    measure('send_email', lambda: monitor.send_email(config, 'bench', body, 'ops@localhost'),
+            args.iterations)
+
+
+def bench_endpoint(args, sink):
+    os.environ.update({
+        'SMTP_SERVER': sink.host,
+        'SMTP_PORT': str(sink.port),
+        'SMTP_USERNAME': 'bench',
+        'SMTP_PASSWORD': 'bench',
+        'SENDER_EMAIL': 'bench@localhost',
+    })
+    import app
+    logging.getLogger().setLevel(logging.WARNING)
+    client = app.app.test_client()
+    form = {'receiver_email': 'ops@localhost', 'subject': 'bench', 'body': 'x' * args.log_size}
+
+    def post():
+        response = client.post('/send_email', data=form)
+        if response.status_code >= 400:
+            raise RuntimeError(response.get_json())
+
+    measure('POST /send_email', post, args.iterations)
+
+    bulk = {'messages': [{'receiver_email': 'ops@localhost', 'subject': 'bench', 'body': 'x' * args.log_size}
+                         for _ in range(10)]}
+
+    def post_bulk():
+        response = client.post('/send_bulk', json=bulk)
+        if response.status_code >= 400 or b'"error"' in response.data:
+            raise RuntimeError(response.data)
+
+    measure('POST /send_bulk (10封)', post_bulk, args.iterations)
+
+
+def bench_notify(args):
+    """推送通知到开始检查的延迟（定时间隔设为1小时，只有通知能触发检查）"""
+    import threading
+    from change_notify import ManualNotificationSource
+    from monitor_scheduler import MonitorTarget, MonitorScheduler
+
+    target = MonitorTarget('bench', 'JOB_CONFIG', 'JOB_STATUS', 'Error', 'ops@localhost',
+                           check_interval=3600)
+    checked = threading.Event()
+    scheduler = MonitorScheduler([target], lambda t: checked.set(), max_workers=1)
+    source = ManualNotificationSource([target])
+    source.start(scheduler.trigger)
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    # 等待启动时的首次检查完成
+    checked.wait(5)
+    time.sleep(0.05)
+
+    def notify():
+        checked.clear()
+        source.notify('JOB_CONFIG')
+        if not checked.wait(5):
+            raise RuntimeError('通知后没有触发检查')
+
+    try:
+        measure('notify -> check', notify, args.iterations)
+    finally:
+        source.close()
+        scheduler.stop()
+        thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='监控工具热点路径的离线基准测试')
+    parser.add_argument('--rows', type=int, default=1000, help='模拟作业表每次返回的行数')
+    parser.add_argument('--iterations', type=int, default=50, help='每项测试的执行次数')
+    parser.add_argument('--db-latency', type=float, default=0.0, help='模拟的数据库往返延迟（秒）')
+    parser.add_argument('--log-size', type=int, default=2000, help='合成的 JOB_RESULT_LOG 长度')
+    parser.add_argument('--max-log-chars', type=int, default=1000, help='数据库端截断后的日志长度')
+    parser.add_argument('--arraysize', type=int, default=500, help='流式读取时每批的行数')
+    parser.add_argument('--only', choices=['query', 'render', 'check', 'sqlite', 'send', 'endpoint', 'notify'],
+                        action='append', help='只运行指定的测试，可重复指定')
+    args = parser.parse_args(argv)
+    selected = set(args.only or ['query', 'render', 'check', 'sqlite', 'send', 'endpoint', 'notify'])
+
+    import monitor_oracle as monitor
+    # 基准测试时只保留警告以上的日志，避免日志输出影响结果
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with SMTPSink() as sink:
+        config = make_config(sink)
+        if 'query' in selected:
+            bench_query(monitor, args)
+        if 'render' in selected:
+            bench_render(args)
+        if 'check' in selected:
+            bench_check_target(monitor, args, config, sink)
+        if 'sqlite' in selected:
+            bench_sqlite(monitor, args, config, sink)
+        if 'send' in selected:
+            bench_send_email(monitor, args, config, sink)
+        if 'endpoint' in selected:
+            bench_endpoint(args, sink)
+        if 'notify' in selected:
+            bench_notify(args)
+        print(f"SMTP接收端共收到 {sink.messages} 封邮件，{sink.bytes} 字节，登录 {sink.logins} 次")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
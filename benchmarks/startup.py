@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+# 在全新的子进程中执行，测量导入耗时和首次检查/首个请求的耗时
+MONITOR_PROBE = r'''
+import json, time
+start = time.perf_counter()
+import monitor_oracle as monitor
+imported = time.perf_counter()
+from benchmarks.fakes import FakeConnection, FakePool, SMTPSink
+from benchmarks.run import make_config
+from change_tracker import ChangeTracker
+with SMTPSink() as sink:
+    config = make_config(sink)
+    target = monitor.load_targets(config)[0]
+    pool = FakePool(FakeConnection(rows=ROWS))
+    ready = time.perf_counter()
+    monitor.check_target(config, pool, target, ChangeTracker(None, target.name))
+    checked = time.perf_counter()
+print(json.dumps({'import': imported - start, 'first': checked - ready}))
+'''
+
+APP_PROBE = r'''
+import os, json, time
+from benchmarks.fakes import SMTPSink
+with SMTPSink() as sink:
+    os.environ.update({'SMTP_SERVER': sink.host, 'SMTP_PORT': str(sink.port), 'SMTP_USERNAME': 'bench',
+                       'SMTP_PASSWORD': 'bench', 'SENDER_EMAIL': 'bench@localhost',
+                       'CONFIG__WEB__RELOAD_INTERVAL': '0'})
+    start = time.perf_counter()
+    import app
+    imported = time.perf_counter()
+    response = app.app.test_client().post('/send_email', data={
+        'receiver_email': 'ops@localhost', 'subject': 'bench', 'body': 'startup'})
+    checked = time.perf_counter()
+    if response.status_code >= 400:
+        raise SystemExit(response.get_data(as_text=True))
+print(json.dumps({'import': imported - start, 'first': checked - imported}))
+'''
+
+
+def run_probe(name, code, args, root):
+    """多次启动子进程，返回进程总耗时、导入耗时和首次处理耗时的中位数"""
+    totals, imports, firsts = [], [], []
+    for _ in range(args.runs):
+        t0 = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code.replace('ROWS', str(args.rows))],
+                                cwd=root, capture_output=True, text=True)
+        total = time.perf_counter() - t0
+        if result.returncode != 0:
+            reason = (result.stderr.strip().splitlines() or ['未知错误'])[-1]
+            print(f"{name:<16} 跳过: {reason}")
+            return None
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        totals.append(total)
+        imports.append(data['import'])
+        firsts.append(data['first'])
+    print(f"{name:<16} 进程 {statistics.median(totals) * 1000:>8.1f} ms  "
+          f"导入 {statistics.median(imports) * 1000:>8.1f} ms  "
+          f"首次处理 {statistics.median(firsts) * 1000:>8.1f} ms")
+    return totals, imports, firsts
+
+
+def run_executable(command, runs):
+    """测量打包后的可执行文件从启动到退出的耗时（例如 OracleMonitor --check-config）"""
+    totals = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run(command, check=True, capture_output=True)
+        totals.append(time.perf_counter() - t0)
+    print(f"{os.path.basename(command[0]):<16} 进程 {statistics.median(totals) * 1000:>8.1f} ms  "
+          f"最慢 {max(totals) * 1000:>8.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='各入口程序的冷启动耗时测试')
+    parser.add_argument('--runs', type=int, default=5, help='每个入口启动的次数，取中位数')
+    parser.add_argument('--rows', type=int, default=100, help='首次检查时模拟返回的行数')
+    parser.add_argument('--only', choices=['monitor', 'app'], action='append',
+                        help='只测试指定的入口，可重复指定')
+    parser.add_argument('--exe', nargs=argparse.REMAINDER,
+                        help='测试打包后的可执行文件及其参数，例如 --exe dist/OracleMonitor/OracleMonitor --check-config')
+    args = parser.parse_args(argv)
+
+    if args.exe:
+        run_executable(args.exe, args.runs)
+        return 0
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    selected = set(args.only or ['monitor', 'app'])
+    if 'monitor' in selected:
+        run_probe('monitor_oracle', MONITOR_PROBE, args, root)
+    if 'app' in selected:
+        run_probe('app', APP_PROBE, args, root)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
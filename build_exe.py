@@ -1,9 +1,19 @@
 import os
 import sys
 import shutil
+import argparse
 import subprocess
 import datetime
 
+# 快速启动模式下排除两个程序都用不到的模块，减少需要加载和扫描的文件
+COMMON_EXCLUDES = ['tkinter', 'unittest', 'doctest', 'lib2to3', 'pydoc_data', 'test',
+                   'setuptools', 'pip', 'distutils']
+# 各程序不需要的第三方依赖
+MONITOR_EXCLUDES = ['flask', 'flask_cors', 'werkzeug', 'jinja2', 'waitress']
+APP_EXCLUDES = ['cx_Oracle', 'aiosmtplib']
+
+EXE_SUFFIX = '.exe' if os.name == 'nt' else ''
+
 def find_pyinstaller():
     """寻找PyInstaller可执行文件路径"""
     # 尝试在脚本目录或者PATH中找到pyinstaller
@@ -21,7 +31,28 @@ def find_pyinstaller():
     except (subprocess.SubprocessError, IndexError):
         return None
 
-def build_exe():
+def pyinstaller_command(pyinstaller_path, name, script, fast=False, excludes=()):
+    """生成 PyInstaller 命令
+
+    fast 为 True 时使用目录模式（--onedir）：启动时不再把整个程序解压到临时目录，
+    同时排除不需要的模块并关闭UPX压缩，适合由服务管理器频繁重启的场景。
+    """
+    cmd = [
+        pyinstaller_path,
+        '--noconfirm',
+        '--name', name,
+        '--add-data', f'config.ini{os.pathsep}.',  # 将config.ini添加到程序中
+    ]
+    if fast:
+        cmd += ['--onedir', '--noupx']
+        for module in COMMON_EXCLUDES + list(excludes):
+            cmd += ['--exclude-module', module]
+    else:
+        cmd.append('--onefile')  # 创建单个可执行文件
+    cmd.append(script)
+    return cmd
+
+def build_exe(fast=False):
     """构建EXE文件"""
     print("正在打包Oracle监控工具为EXE文件...")
     
@@ -40,13 +71,8 @@ def build_exe():
         print("警告: 未找到config.ini文件")
         
     # 构建monitor_oracle.exe
-    monitor_cmd = [
-        pyinstaller_path,
-        '--onefile',  # 创建单个可执行文件
-        '--name', 'OracleMonitor',
-        '--add-data', 'config.ini;.',  # 将config.ini添加到EXE中
-        'monitor_oracle.py'
-    ]
+    monitor_cmd = pyinstaller_command(pyinstaller_path, 'OracleMonitor', 'monitor_oracle.py',
+                                      fast, MONITOR_EXCLUDES)
     
     print("执行命令:", " ".join(monitor_cmd))
     try:
@@ -57,13 +83,7 @@ def build_exe():
         return False
     
     # 构建邮件发送器app.exe
-    app_cmd = [
-        pyinstaller_path,
-        '--onefile',  # 创建单个可执行文件
-        '--name', 'EmailSender',
-        '--add-data', 'config.ini;.',  # 将config.ini添加到EXE中
-        'app.py'
-    ]
+    app_cmd = pyinstaller_command(pyinstaller_path, 'EmailSender', 'app.py', fast, APP_EXCLUDES)
     
     print("\n执行命令:", " ".join(app_cmd))
     try:
@@ -80,12 +100,19 @@ def build_exe():
     
     # 复制文件到release目录
     try:
-        # 复制可执行文件
-        shutil.copy2(os.path.join('dist', 'OracleMonitor.exe'), release_dir)
-        shutil.copy2(os.path.join('dist', 'EmailSender.exe'), release_dir)
-        
-        # 复制配置文件
-        shutil.copy2('config.ini', release_dir)
+        if fast:
+            # 目录模式：每个程序一个目录，配置文件放在可执行文件旁边
+            for name in ('OracleMonitor', 'EmailSender'):
+                target_dir = os.path.join(release_dir, name)
+                shutil.copytree(os.path.join('dist', name), target_dir)
+                shutil.copy2('config.ini', target_dir)
+        else:
+            # 复制可执行文件
+            shutil.copy2(os.path.join('dist', 'OracleMonitor' + EXE_SUFFIX), release_dir)
+            shutil.copy2(os.path.join('dist', 'EmailSender' + EXE_SUFFIX), release_dir)
+
+            # 复制配置文件
+            shutil.copy2('config.ini', release_dir)
         
         # 复制README
         if os.path.exists('README.md'):
@@ -101,4 +128,7 @@ def build_exe():
     return True
 
 if __name__ == "__main__":
-    build_exe() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='使用PyInstaller打包监控工具和邮件发送器')
+    parser.add_argument('--fast', action='store_true',
+                        help='快速启动模式：目录模式打包，排除不需要的模块，启动时不解压')
+    build_exe(parser.parse_args().fast) 
\ No newline at end of file
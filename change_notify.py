@@ -0,0 +1,233 @@
+import logging
+import threading
+
+from backoff import Backoff
+from metrics import NOTIFICATIONS
+from settings import ConfigError
+
+logger = logging.getLogger(__name__)
+
+MODE_CQN = 'cqn'
+MODE_AQ = 'aq'
+
+
+class NotificationSource:
+    """数据变更通知源的公共部分
+
+    通知源只负责把“某张表/某个目标有变化”翻译成目标名称并回调 callback(names)，
+    真正的查询仍由 check_target 完成，因此增量检测、告警去重等逻辑不受影响。
+    """
+
+    def __init__(self, targets):
+        self.targets = list(targets)
+        self._callback = None
+
+    def start(self, callback):
+        self._callback = callback
+
+    def _targets_for(self, name):
+        """按目标名称或表名（可带 SCHEMA. 前缀）查找对应的监控目标"""
+        name = name.strip()
+        table = name.rsplit('.', 1)[-1].upper()
+        return [target.name for target in self.targets
+                if target.name == name or target.table_name.rsplit('.', 1)[-1].upper() == table]
+
+    def _dispatch(self, names):
+        names = sorted(set(names))
+        if not names or self._callback is None:
+            return
+        for name in names:
+            NOTIFICATIONS.labels(target=name).inc()
+        logger.info(f"收到数据变更通知，立即检查: {', '.join(names)}")
+        try:
+            self._callback(names)
+        except Exception as e:
+            logger.error(f"处理数据变更通知失败: {str(e)}", exc_info=True)
+
+    def close(self):
+        self._callback = None
+
+
+class ManualNotificationSource(NotificationSource):
+    """手动触发的通知源，用于测试和基准测试，代替数据库推送"""
+
+    def notify(self, name):
+        """模拟一次变更通知，name 为目标名称或表名"""
+        self._dispatch(self._targets_for(name))
+
+
+class CQNNotificationSource(NotificationSource):
+    """基于 Oracle 连续查询通知（CQN）的通知源
+
+    为每个目标注册一条只包含条件字段的查询，只有满足告警条件的行发生插入或更新时，
+    数据库才会回调，空闲时不产生任何查询。需要授予 CHANGE NOTIFICATION 权限，
+    并且数据库能够连回本机的 port 端口（0 表示随机端口）。
+    """
+
+    def __init__(self, username, password, dsn, targets, port=0, ip_address=None):
+        super().__init__(targets)
+        self.username = username
+        self.password = password
+        self.dsn = dsn
+        self.port = port
+        self.ip_address = ip_address
+        self._connection = None
+        self._subscription = None
+        self._queries = {}
+
+    def start(self, callback):
+        # 延迟导入，与 oracle_pool 一致，启动时不加载Oracle客户端库
+        import cx_Oracle
+        super().start(callback)
+        self._connection = cx_Oracle.connect(self.username, self.password, self.dsn,
+                                             events=True, encoding='UTF-8')
+        kwargs = {'port': self.port}
+        if self.ip_address:
+            kwargs['ipAddress'] = self.ip_address
+        self._subscription = self._connection.subscribe(
+            namespace=cx_Oracle.SUBSCR_NAMESPACE_DBCHANGE,
+            callback=self._on_message,
+            operations=cx_Oracle.OPCODE_INSERT | cx_Oracle.OPCODE_UPDATE,
+            qos=cx_Oracle.SUBSCR_QOS_QUERY | cx_Oracle.SUBSCR_QOS_RELIABLE,
+            **kwargs
+        )
+        for target in self.targets:
+            values = target.condition_values
+            placeholders = ', '.join(f':value{i}' for i in range(len(values)))
+            sql = (f"SELECT {target.field_name} FROM {target.table_name} "
+                   f"WHERE {target.field_name} IN ({placeholders})")
+            query_id = self._subscription.registerquery(
+                sql, {f'value{i}': value for i, value in enumerate(values)})
+            self._queries.setdefault(query_id, []).append(target.name)
+        logger.info(f"已注册CQN订阅，共 {len(self.targets)} 个目标")
+
+    def _on_message(self, message):
+        import cx_Oracle
+        if message.type == cx_Oracle.EVENT_QUERYCHANGE:
+            names = []
+            for query in message.queries:
+                names.extend(self._queries.get(query.id, []))
+            self._dispatch(names)
+        elif message.type == cx_Oracle.EVENT_OBJCHANGE:
+            names = []
+            for table in message.tables:
+                names.extend(self._targets_for(table.name))
+            self._dispatch(names)
+        elif message.type in (cx_Oracle.EVENT_DEREG, cx_Oracle.EVENT_SHUTDOWN):
+            # 订阅失效后只能依靠定时轮询，直到程序重启
+            logger.warning("CQN订阅已被数据库注销，改为仅依靠定时轮询")
+
+    def close(self):
+        super().close()
+        if self._connection is not None:
+            try:
+                if self._subscription is not None:
+                    self._connection.unsubscribe(self._subscription)
+            except Exception as e:
+                logger.error(f"注销CQN订阅失败: {str(e)}")
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+            self._subscription = None
+
+
+class AQNotificationSource(NotificationSource):
+    """基于 Oracle 高级队列（AQ）的通知源
+
+    被监控表上的触发器把表名或目标名称作为 RAW 消息写入队列，后台线程阻塞等待出队，
+    消息到达后立即回调。适用于数据库无法连回监控主机、不能使用CQN的环境。
+    """
+
+    def __init__(self, username, password, dsn, targets, queue_name, wait=5, backoff=None):
+        super().__init__(targets)
+        self.username = username
+        self.password = password
+        self.dsn = dsn
+        self.queue_name = queue_name
+        self.wait = wait
+        self.backoff = backoff or Backoff(base_delay=1.0, max_delay=60.0)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self, callback):
+        super().start(callback)
+        self._thread = threading.Thread(target=self._run, name='aq-notify', daemon=True)
+        self._thread.start()
+        logger.info(f"开始监听AQ队列 {self.queue_name}")
+
+    def _drain(self, connection):
+        import cx_Oracle
+        queue = connection.queue(self.queue_name)
+        queue.deqoptions.wait = self.wait
+        while not self._stop_event.is_set():
+            message = queue.deqOne()
+            if message is None:
+                continue
+            names = self._targets_for(bytes(message.payload).decode('utf-8'))
+            # 继续取出已经到达的消息，一批变更只触发一次检查
+            queue.deqoptions.wait = cx_Oracle.DEQ_NO_WAIT
+            while True:
+                message = queue.deqOne()
+                if message is None:
+                    break
+                names.extend(self._targets_for(bytes(message.payload).decode('utf-8')))
+            queue.deqoptions.wait = self.wait
+            connection.commit()
+            self._dispatch(names)
+
+    def _run(self):
+        import cx_Oracle
+        attempt = 0
+        while not self._stop_event.is_set():
+            connection = None
+            try:
+                connection = cx_Oracle.connect(self.username, self.password, self.dsn, encoding='UTF-8')
+                attempt = 0
+                self._drain(connection)
+            except cx_Oracle.DatabaseError as e:
+                delay = self.backoff.delay(attempt)
+                attempt += 1
+                logger.error(f"读取AQ队列失败，{delay:.1f} 秒后重试: {str(e)}")
+                self._stop_event.wait(delay)
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+    def close(self):
+        super().close()
+        self._stop_event.set()
+        if self._thread is not None:
+            # 最多等待一次出队超时
+            self._thread.join(self.wait + 1)
+            self._thread = None
+
+
+def create_notification_source(notify_config, oracle_config, targets):
+    """根据 [NOTIFY] 配置创建通知源，未配置或 mode 为空时返回 None（仅定时轮询）"""
+    if notify_config is None:
+        return None
+    mode = notify_config.get('mode', '').strip().lower()
+    if not mode or mode == 'none':
+        return None
+    if not targets:
+        # 只监控非Oracle数据库时没有可以订阅的表
+        logger.info("没有位于 [ORACLE] 数据库上的监控目标，不启用数据变更通知")
+        return None
+    missing = [key for key in ('username', 'password', 'dsn') if not oracle_config.get(key)]
+    if missing:
+        raise ConfigError(f"启用数据变更通知需要在 [ORACLE] 中配置: {', '.join(missing)}")
+    credentials = (oracle_config['username'], oracle_config['password'], oracle_config['dsn'])
+    if mode == MODE_CQN:
+        return CQNNotificationSource(*credentials, targets,
+                                     port=int(notify_config.get('port', 0)),
+                                     ip_address=notify_config.get('ip_address') or None)
+    if mode == MODE_AQ:
+        return AQNotificationSource(*credentials, targets,
+                                    queue_name=notify_config.get('queue_name', 'MONITOR_EVENTS'),
+                                    wait=int(notify_config.get('wait', 5)))
+    raise ValueError(f"未知的通知模式: {mode}")
@@ -0,0 +1,196 @@
+import os
+import json
+import hashlib
+import logging
+import datetime
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 增量检测模式
+MODE_FULL = 'full'                # 每次全量查询、全量告警（原有行为）
+MODE_WATERMARK = 'watermark'      # 按水位列（时间戳、SCN 或 ORA_ROWSCN）只查询新增/变化的行
+MODE_FINGERPRINT = 'fingerprint'  # 全量查询，但只对指纹集合中没有出现过的行告警
+
+MODES = (MODE_FULL, MODE_WATERMARK, MODE_FINGERPRINT)
+
+
+def _encode(value):
+    """把水位值转换为可以写入JSON的形式"""
+    if isinstance(value, datetime.datetime):
+        return {'type': 'datetime', 'value': value.isoformat()}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict) and value.get('type') == 'datetime':
+        return datetime.datetime.fromisoformat(value['value'])
+    return value
+
+
+def row_fingerprint(row):
+    """计算一行数据的指纹，行内容发生变化时指纹也会变化"""
+    digest = hashlib.sha1()
+    for value in row:
+        digest.update(str(value).encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+class StateStore:
+    """保存各监控目标增量状态的本地JSON文件
+
+    文件内容形如 {"目标名称": {"watermark": ..., "fingerprints": [...]}}，
+    每次更新都先写临时文件再替换，进程异常退出也不会留下损坏的状态文件。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"读取状态文件失败，将重新开始增量检测: {str(e)}")
+            return {}
+
+    def _entry(self, target_name):
+        """返回目标的状态字典（调用方持有锁）"""
+        return self._state.setdefault(target_name, {})
+
+    def _save(self, target_name):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get_value(self, target_name, key, default=None):
+        """读取目标的任意状态值（供告警状态等其他模块使用）"""
+        with self._lock:
+            return self._entry(target_name).get(key, default)
+
+    def set_value(self, target_name, key, value):
+        with self._lock:
+            self._entry(target_name)[key] = value
+            self._save(target_name)
+
+    def get_watermark(self, target_name):
+        with self._lock:
+            return _decode(self._entry(target_name).get('watermark'))
+
+    def set_watermark(self, target_name, watermark):
+        with self._lock:
+            self._entry(target_name)['watermark'] = _encode(watermark)
+            self._save(target_name)
+
+    def get_fingerprints(self, target_name):
+        with self._lock:
+            return set(self._entry(target_name).get('fingerprints', []))
+
+    def set_fingerprints(self, target_name, fingerprints):
+        with self._lock:
+            self._entry(target_name)['fingerprints'] = sorted(fingerprints)
+            self._save(target_name)
+
+    def invalidate(self, target_names):
+        """丢弃缓存的目标状态，本地文件中的状态只由本进程修改，无需重新读取"""
+
+
+class SharedStateStore(StateStore):
+    """多节点共用的状态存储，接口与 StateStore 相同
+
+    每个目标的状态单独保存为一条记录（JSON），由当前持有该目标租约的节点读写，
+    节点之间不会互相覆盖。接管目标时调用 invalidate() 丢弃本地缓存，
+    下次使用时读取原节点保存的水位、指纹和告警状态，接管后不会重复告警。
+    backend 需要提供 load_state(名称) 和 save_state(名称, 文本)，见 cluster 模块中的租约存储。
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._state = {}
+
+    def _entry(self, target_name):
+        if target_name not in self._state:
+            # 读取失败时直接抛出，本轮检查失败后重试，不能当作没有状态而重新告警
+            text = self.backend.load_state(target_name)
+            self._state[target_name] = json.loads(text) if text else {}
+        return self._state[target_name]
+
+    def _save(self, target_name):
+        self.backend.save_state(target_name, json.dumps(self._state[target_name], ensure_ascii=False))
+
+    def invalidate(self, target_names):
+        with self._lock:
+            for name in target_names:
+                self._state.pop(name, None)
+
+
+class ChangeTracker:
+    """单个监控目标的增量检测逻辑
+
+    用法：
+        since = tracker.since()              # 传给查询，作为水位条件
+        for row in tracker.filter(rows):     # 只返回需要告警的行
+            ...
+        ... 发送告警 ...
+        tracker.commit()                     # 告警成功后再提交新的水位/指纹
+    """
+
+    def __init__(self, store, target_name, mode=MODE_FULL, watermark_index=None):
+        if mode not in MODES:
+            raise ValueError(f"不支持的增量检测模式: {mode}")
+        self.store = store
+        self.target_name = target_name
+        self.mode = mode
+        self.watermark_index = watermark_index
+        self._pending = None
+
+    def since(self):
+        """返回水位模式下的上次水位值，其他模式返回None"""
+        if self.mode != MODE_WATERMARK:
+            return None
+        return self.store.get_watermark(self.target_name)
+
+    def filter(self, rows):
+        """逐行返回需要告警的行，并记录待提交的新状态
+
+        rows 可以是生成器，本方法不会把全部行保存在内存中。
+        """
+        if self.mode == MODE_WATERMARK:
+            self._pending = None
+            for row in rows:
+                watermark = row[self.watermark_index]
+                if watermark is not None and (self._pending is None or watermark > self._pending):
+                    self._pending = watermark
+                yield row
+        elif self.mode == MODE_FINGERPRINT:
+            seen = self.store.get_fingerprints(self.target_name)
+            # 只保存本轮出现过的指纹；已经离开告警条件的行不再保留，之后再次出现时会重新告警
+            current = set()
+            for row in rows:
+                fingerprint = row_fingerprint(row)
+                if fingerprint in current:
+                    continue
+                current.add(fingerprint)
+                if fingerprint not in seen:
+                    yield row
+            self._pending = current
+        else:
+            yield from rows
+
+    def commit(self):
+        """提交本轮检测后的新状态"""
+        if self.mode == MODE_WATERMARK and self._pending is not None:
+            self.store.set_watermark(self.target_name, self._pending)
+        elif self.mode == MODE_FINGERPRINT and self._pending is not None:
+            self.store.set_fingerprints(self.target_name, self._pending)
+        self._pending = None
@@ -0,0 +1,347 @@
+import os
+import time
+import socket
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from metrics import CLUSTER_OWNED_TARGETS
+from settings import TRUE_VALUES
+
+logger = logging.getLogger(__name__)
+
+NODE_PREFIX = 'node:'
+TARGET_PREFIX = 'target:'
+
+
+class SQLiteLeaseStore:
+    """基于SQLite的租约表，用于单机多进程部署和测试
+
+    多个进程通过同一个数据库文件协调；跨主机部署请使用 OracleLeaseStore。
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " name TEXT PRIMARY KEY,"
+            " owner TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS target_state ("
+            " name TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+
+    def acquire(self, name, owner, ttl):
+        """获取或续约租约，租约被其他节点持有且未过期时返回False"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT owner, expires_at FROM leases WHERE name = ?",
+                                       (name,)).fetchone()
+                acquired = row is None or row[0] == owner or row[1] <= now
+                if acquired:
+                    self._db.execute("INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                                     (name, owner, now + ttl))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return acquired
+
+    def release(self, name, owner):
+        with self._lock:
+            self._db.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def active(self):
+        """返回所有未过期的租约 {名称: 持有者}"""
+        with self._lock:
+            rows = self._db.execute("SELECT name, owner FROM leases WHERE expires_at > ?",
+                                    (time.time(),)).fetchall()
+        return dict(rows)
+
+    def load_state(self, name):
+        """读取目标的状态（JSON文本），没有时返回None"""
+        with self._lock:
+            row = self._db.execute("SELECT state FROM target_state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row is not None else None
+
+    def save_state(self, name, state):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO target_state (name, state, updated_at) VALUES (?, ?, ?)",
+                             (name, state, time.time()))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class OracleLeaseStore:
+    """保存在共享Oracle表中的租约，多台主机上的监控实例通过它协调
+
+    过期时间使用数据库时间（SYSTIMESTAMP）计算，不受各主机时钟偏差影响。
+    各目标的告警和增量检测状态保存在 state_table 中，接管目标的节点从中继续。表结构：
+
+        CREATE TABLE MONITOR_LEASES (
+            LEASE_NAME VARCHAR2(200) PRIMARY KEY,
+            OWNER      VARCHAR2(200) NOT NULL,
+            EXPIRES_AT TIMESTAMP WITH TIME ZONE NOT NULL
+        );
+        CREATE TABLE MONITOR_STATE (
+            TARGET_NAME VARCHAR2(200) PRIMARY KEY,
+            STATE       CLOB NOT NULL,
+            UPDATED_AT  TIMESTAMP WITH TIME ZONE NOT NULL
+        );
+    """
+
+    def __init__(self, pool, table='MONITOR_LEASES', state_table='MONITOR_STATE'):
+        self.pool = pool
+        self.table = table
+        self.state_table = state_table
+
+    def acquire(self, name, owner, ttl):
+        import cx_Oracle
+        sql = (
+            f"MERGE INTO {self.table} l"
+            " USING (SELECT :name AS lease_name FROM dual) s ON (l.lease_name = s.lease_name)"
+            " WHEN MATCHED THEN UPDATE SET l.owner = :owner,"
+            "  l.expires_at = SYSTIMESTAMP + NUMTODSINTERVAL(:ttl, 'SECOND')"
+            "  WHERE l.owner = :owner OR l.expires_at <= SYSTIMESTAMP"
+            " WHEN NOT MATCHED THEN INSERT (lease_name, owner, expires_at)"
+            "  VALUES (:name, :owner, SYSTIMESTAMP + NUMTODSINTERVAL(:ttl, 'SECOND'))"
+        )
+        with self.pool.acquire() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(sql, {'name': name, 'owner': owner, 'ttl': ttl})
+                acquired = cursor.rowcount == 1
+                connection.commit()
+            except cx_Oracle.IntegrityError:
+                # 其他节点同时插入了同名租约
+                connection.rollback()
+                acquired = False
+            finally:
+                cursor.close()
+        return acquired
+
+    def release(self, name, owner):
+        with self.pool.acquire() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"DELETE FROM {self.table} WHERE lease_name = :name AND owner = :owner",
+                               {'name': name, 'owner': owner})
+                connection.commit()
+            finally:
+                cursor.close()
+
+    def active(self):
+        with self.pool.acquire() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"SELECT lease_name, owner FROM {self.table} WHERE expires_at > SYSTIMESTAMP")
+                return dict(cursor.fetchall())
+            finally:
+                cursor.close()
+
+    def load_state(self, name):
+        with self.pool.acquire() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"SELECT state FROM {self.state_table} WHERE target_name = :name", {'name': name})
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                return row[0].read() if hasattr(row[0], 'read') else row[0]
+            finally:
+                cursor.close()
+
+    def save_state(self, name, state):
+        import cx_Oracle
+        sql = (
+            f"MERGE INTO {self.state_table} t"
+            " USING (SELECT :name AS target_name FROM dual) s ON (t.target_name = s.target_name)"
+            " WHEN MATCHED THEN UPDATE SET t.state = :state, t.updated_at = SYSTIMESTAMP"
+            " WHEN NOT MATCHED THEN INSERT (target_name, state, updated_at)"
+            "  VALUES (:name, :state, SYSTIMESTAMP)"
+        )
+        with self.pool.acquire() as connection:
+            cursor = connection.cursor()
+            try:
+                # 指纹较多时状态会超过 VARCHAR2 的长度限制，按 CLOB 绑定
+                cursor.setinputsizes(state=cx_Oracle.CLOB)
+                cursor.execute(sql, {'name': name, 'state': state})
+                connection.commit()
+            finally:
+                cursor.close()
+
+    def close(self):
+        pass
+
+
+def _score(node, name):
+    # 使用稳定的哈希，所有节点对同一组节点算出相同的分配结果
+    return hashlib.md5(f"{node}|{name}".encode('utf-8')).hexdigest()
+
+
+def assign(names, nodes):
+    """最高随机权重（rendezvous）哈希：返回 {名称: 节点}
+
+    节点加入或离开时只有属于该节点的目标会重新分配，其余目标保持不动。
+    """
+    nodes = sorted(nodes)
+    if not nodes:
+        return {}
+    return {name: max(nodes, key=lambda node: _score(node, name)) for name in names}
+
+
+class ShardCoordinator:
+    """通过租约在多个监控实例之间分配监控目标
+
+    - 每个节点定期续约自己的节点租约，租约未过期的节点视为存活
+    - 按 rendezvous 哈希把目标分配给存活节点，每个目标还有独立的目标租约，
+      同一时刻只有持有目标租约的节点会检查该目标，不会重复查询和重复告警
+    - 节点宕机后其租约在 lease_ttl 秒内过期，目标自动转移到其他节点
+    - 无法续约（例如连不上租约表）超过 lease_ttl 的 80% 时主动放弃所有目标，
+      保证在其他节点接管之前停止检查
+    """
+
+    def __init__(self, store, names, node_id=None, lease_ttl=30, renew_interval=10, on_change=None):
+        if renew_interval * 2 > lease_ttl:
+            raise ValueError("renew_interval 不能超过 lease_ttl 的一半")
+        self.store = store
+        self.names = list(names)
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_ttl = lease_ttl
+        self.renew_interval = renew_interval
+        self.on_change = on_change
+        self._owned = frozenset()
+        self._renewed_at = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _lease_valid(self):
+        # 续约调用可能长时间卡住（如租约表所在数据库无响应），此时租约已快过期，
+        # 不能等 rebalance 出错后才放弃目标
+        return self._renewed_at is not None and time.monotonic() - self._renewed_at <= self.lease_ttl * 0.8
+
+    @property
+    def owned(self):
+        return self._owned if self._lease_valid() else frozenset()
+
+    def owns(self, name):
+        return name in self._owned and self._lease_valid()
+
+    def set_names(self, names):
+        """更新需要分配的目标名称（配置重新加载后调用），下一轮生效"""
+        with self._lock:
+            self.names = list(names)
+
+    def _set_owned(self, owned):
+        owned = frozenset(owned)
+        if owned == self._owned:
+            return
+        gained, lost = owned - self._owned, self._owned - owned
+        self._owned = owned
+        CLUSTER_OWNED_TARGETS.set(len(owned))
+        if gained:
+            logger.info(f"节点 {self.node_id} 接管监控目标: {', '.join(sorted(gained))}")
+        if lost:
+            logger.info(f"节点 {self.node_id} 交出监控目标: {', '.join(sorted(lost))}")
+        if self.on_change is not None:
+            self.on_change(owned, gained)
+
+    def rebalance(self):
+        """执行一轮续约和分配，返回本节点持有的目标名称"""
+        with self._lock:
+            names = list(self.names)
+        # 租约从本轮开始时算起，本轮耗时较长时也不会高估剩余的有效期
+        started = time.monotonic()
+        try:
+            self.store.acquire(NODE_PREFIX + self.node_id, self.node_id, self.lease_ttl)
+            leases = self.store.active()
+            nodes = {owner for name, owner in leases.items() if name.startswith(NODE_PREFIX)}
+            nodes.add(self.node_id)
+            desired = {name for name, node in assign(names, nodes).items() if node == self.node_id}
+            owned = set()
+            for name in names:
+                lease = TARGET_PREFIX + name
+                if name in desired:
+                    if self.store.acquire(lease, self.node_id, self.lease_ttl):
+                        owned.add(name)
+                elif leases.get(lease) == self.node_id:
+                    if name in self._owned:
+                        # 已分配给其他节点：本轮先停止调度但继续持有租约，
+                        # 等正在执行的检查结束后，下一轮再释放给对方
+                        self.store.acquire(lease, self.node_id, self.lease_ttl)
+                    else:
+                        self.store.release(lease, self.node_id)
+        except Exception as e:
+            logger.error(f"续约监控目标租约失败: {str(e)}")
+            if not self._lease_valid():
+                # 租约即将过期，其他节点可能已经接管，停止检查以免重复告警
+                self._set_owned(())
+            return self._owned
+        self._renewed_at = started
+        self._set_owned(owned)
+        return self._owned
+
+    def _run(self):
+        while not self._stop_event.wait(self.renew_interval):
+            self.rebalance()
+
+    def start(self):
+        self.rebalance()
+        self._thread = threading.Thread(target=self._run, name='shard-coordinator', daemon=True)
+        self._thread.start()
+        logger.info(f"节点 {self.node_id} 已加入监控集群，租约有效期 {self.lease_ttl} 秒")
+        return self
+
+    def stop(self):
+        """停止续约并释放所有租约，其他节点可以立即接管"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            # 释放只删除本节点持有的租约，交接中的目标也一并释放
+            for name in self.names:
+                self.store.release(TARGET_PREFIX + name, self.node_id)
+            self.store.release(NODE_PREFIX + self.node_id, self.node_id)
+        except Exception as e:
+            logger.error(f"释放租约失败: {str(e)}")
+        self._owned = frozenset()
+        self.store.close()
+
+
+def create_coordinator(cluster_config, pool, names, on_change=None):
+    """根据 [CLUSTER] 配置创建协调器，未启用时返回 None（单实例运行）"""
+    if cluster_config is None or str(cluster_config.get('enabled', 'false')).lower() not in TRUE_VALUES:
+        return None
+    backend = cluster_config.get('backend', 'oracle').lower()
+    if backend == 'oracle':
+        store = OracleLeaseStore(pool, cluster_config.get('table', 'MONITOR_LEASES'),
+                                 cluster_config.get('state_table', 'MONITOR_STATE'))
+    elif backend == 'sqlite':
+        store = SQLiteLeaseStore(cluster_config.get('path', os.path.join('state', 'leases.db')))
+    else:
+        raise ValueError(f"未知的租约存储: {backend}")
+    return ShardCoordinator(
+        store,
+        names,
+        node_id=cluster_config.get('node_id') or None,
+        lease_ttl=float(cluster_config.get('lease_ttl', 30)),
+        renew_interval=float(cluster_config.get('renew_interval', 10)),
+        on_change=on_change,
+    )
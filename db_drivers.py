@@ -0,0 +1,256 @@
+import time
+import queue
+import logging
+import importlib
+import itertools
+import threading
+from contextlib import contextmanager
+
+from backoff import Backoff
+from metrics import DB_RECONNECTS
+
+logger = logging.getLogger(__name__)
+
+
+class Dialect:
+    """SQL方言：参数占位符、大字段截断和结果行数限制的写法
+
+    检查SQL由 monitor_oracle.build_check_query 按方言生成，各数据库共用同一条查询路径。
+    """
+
+    name = 'generic'
+
+    def __init__(self, paramstyle='named'):
+        if paramstyle not in ('named', 'pyformat', 'qmark', 'format'):
+            raise ValueError(f"不支持的参数风格: {paramstyle}")
+        self.paramstyle = paramstyle
+
+    def placeholder(self, name):
+        if self.paramstyle == 'named':
+            return f':{name}'
+        if self.paramstyle == 'pyformat':
+            return f'%({name})s'
+        if self.paramstyle == 'qmark':
+            return '?'
+        return '%s'
+
+    def bind(self, names, params):
+        """按占位符顺序组织参数，位置参数风格返回列表，命名风格返回字典"""
+        if self.paramstyle in ('qmark', 'format'):
+            return [params[name] for name in names]
+        return {name: params[name] for name in names}
+
+    def truncate(self, column, length):
+        return f"SUBSTR({column}, 1, {length})"
+
+    def limit(self, query, count):
+        return f"{query} FETCH FIRST {count} ROWS ONLY"
+
+    def cursor(self, connection):
+        """创建执行检查SQL的游标"""
+        return connection.cursor()
+
+    def prepare_cursor(self, cursor, arraysize):
+        cursor.arraysize = arraysize
+
+
+class OracleDialect(Dialect):
+    name = 'oracle'
+
+    def __init__(self):
+        super().__init__('named')
+
+    def truncate(self, column, length):
+        # 在数据库端截断大字段，避免把整个CLOB传到客户端
+        return f"DBMS_LOB.SUBSTR({column}, {length}, 1)"
+
+    def prepare_cursor(self, cursor, arraysize):
+        cursor.arraysize = arraysize
+        cursor.prefetchrows = arraysize
+
+
+class SQLiteDialect(Dialect):
+    name = 'sqlite'
+
+    def __init__(self):
+        super().__init__('named')
+
+    def limit(self, query, count):
+        return f"{query} LIMIT {count}"
+
+
+class PostgreSQLDialect(Dialect):
+    name = 'postgresql'
+
+    def __init__(self, paramstyle='pyformat'):
+        super().__init__(paramstyle)
+        self._cursor_ids = itertools.count()
+
+    def cursor(self, connection):
+        # psycopg 的普通游标在 execute 时就把全部结果读到客户端；
+        # 命名游标在服务器端保存结果，fetchmany 每次只取 arraysize 行
+        try:
+            return connection.cursor(name=f"monitor_check_{next(self._cursor_ids)}")
+        except TypeError:
+            # 不支持命名游标的驱动（如 pg8000）
+            return connection.cursor()
+
+
+ORACLE = OracleDialect()
+SQLITE = SQLiteDialect()
+
+
+class DBAPIPool:
+    """通用 DB-API 2.0 连接池，接口与 OraclePool 相同
+
+    - 空闲连接放在后进先出队列中复用，最多同时借出 max_size 个连接
+    - 连接空闲超过 ping_idle_seconds 后，借出前先执行一次 SELECT 1 确认连接可用（按每个连接分别计时）
+    - 连接或检测失败时按带抖动的指数退避重试；出错的连接直接关闭，不再放回池中
+    - 归还连接前回滚，避免只读查询留下未结束的事务
+    """
+
+    def __init__(self, connect, dialect, errors=Exception, max_size=4, ping_idle_seconds=60,
+                 max_attempts=5, backoff=None, name='dbapi'):
+        self.connect = connect
+        self.dialect = dialect
+        self.errors = errors
+        self.max_size = max_size
+        self.ping_idle_seconds = ping_idle_seconds
+        self.max_attempts = max_attempts
+        self.backoff = backoff or Backoff()
+        self.name = name
+        self.reconnects = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _ping(self, connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def _checkout(self):
+        last_error = None
+        for attempt in range(self.max_attempts):
+            if attempt > 0:
+                self.reconnects += 1
+                DB_RECONNECTS.labels(database=self.name).inc()
+                delay = self.backoff.delay(attempt - 1)
+                logger.info(f"{delay:.1f} 秒后重试获取数据库 {self.name} 的连接（第 {attempt} 次重试）")
+                time.sleep(delay)
+            try:
+                connection, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                try:
+                    connection = self.connect()
+                except self.errors as e:
+                    last_error = e
+                    logger.error(f"连接数据库 {self.name} 失败: {str(e)}")
+                    continue
+                logger.info(f"已创建数据库 {self.name} 的新连接")
+                return connection
+
+            if time.monotonic() - released_at > self.ping_idle_seconds:
+                try:
+                    self._ping(connection)
+                except self.errors as e:
+                    last_error = e
+                    logger.info(f"数据库 {self.name} 的连接已断开，丢弃该连接并重新获取...")
+                    self._discard(connection)
+                    continue
+            return connection
+        raise last_error
+
+    @contextmanager
+    def acquire(self):
+        """借出一个连接，用完后自动归还；发生数据库错误的连接会被关闭"""
+        self._slots.acquire()
+        try:
+            connection = self._checkout()
+            try:
+                yield connection
+            except self.errors:
+                logger.info(f"数据库 {self.name} 的连接出错，丢弃该连接")
+                self._discard(connection)
+                raise
+            except BaseException:
+                self._release(connection)
+                raise
+            else:
+                self._release(connection)
+        finally:
+            self._slots.release()
+
+    def _release(self, connection):
+        try:
+            connection.rollback()
+        except self.errors:
+            self._discard(connection)
+            return
+        self._idle.put((connection, time.monotonic()))
+
+    def close(self):
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection)
+
+
+def create_dbapi_pool(name, options, max_size=4):
+    """根据 [DATABASE:名称] 段创建 DB-API 连接池（Oracle 以外的驱动）
+
+    - driver = sqlite：path 指定数据库文件，stmtcachesize 为每个连接缓存的预编译语句数
+    - driver = postgresql：默认使用 psycopg2，dsn 为连接串
+    - driver = dbapi：module 指定任意 DB-API 2.0 模块，dsn 原样传给 module.connect()，
+      dialect 可选 generic（默认，使用 FETCH FIRST）、postgresql、sqlite
+    """
+    driver = options.get('driver', 'oracle').lower()
+    backoff = Backoff(
+        base_delay=float(options.get('reconnect_base_delay', 1)),
+        max_delay=float(options.get('reconnect_max_delay', 30)),
+    )
+    common = {
+        'max_size': int(options.get('pool_max', max_size)),
+        'ping_idle_seconds': float(options.get('ping_idle_seconds', 60)),
+        'max_attempts': int(options.get('reconnect_attempts', 5)),
+        'backoff': backoff,
+        'name': name,
+    }
+    if driver == 'sqlite':
+        import sqlite3
+        path = options['path']
+        cached_statements = int(options.get('stmtcachesize', 50))
+
+        def connect():
+            # 由连接池保证同一时刻只有一个线程使用该连接
+            return sqlite3.connect(path, check_same_thread=False, timeout=30,
+                                   cached_statements=cached_statements)
+
+        return DBAPIPool(connect, SQLITE, errors=sqlite3.Error, **common)
+    if driver in ('postgresql', 'dbapi'):
+        # 驱动模块只在用到时才导入
+        module_name = options.get('module', 'psycopg2' if driver == 'postgresql' else None)
+        if not module_name:
+            raise ValueError(f"数据库 {name} 使用 dbapi 驱动时必须配置 module")
+        module = importlib.import_module(module_name)
+        dialect_name = options.get('dialect', 'postgresql' if driver == 'postgresql' else 'generic').lower()
+        dialects = {'generic': Dialect, 'postgresql': PostgreSQLDialect}
+        if dialect_name == 'sqlite':
+            dialect = SQLITE
+        elif dialect_name in dialects:
+            dialect = dialects[dialect_name](module.paramstyle)
+        else:
+            raise ValueError(f"数据库 {name} 的方言未知: {dialect_name}")
+        dsn = options['dsn']
+        return DBAPIPool(lambda: module.connect(dsn), dialect, errors=module.Error, **common)
+    raise ValueError(f"数据库 {name} 的驱动未知: {driver}")
@@ -0,0 +1,147 @@
+import os
+import time
+import logging
+import threading
+from logging.handlers import RotatingFileHandler
+
+from metrics import SLOW_QUERIES
+
+logger = logging.getLogger(__name__)
+
+# 慢查询诊断信息单独写入该日志记录器，不混入运行日志
+DIAGNOSTICS_LOGGER = 'diagnostics.slow_query'
+
+
+class SlowQueryDiagnostics:
+    """慢查询诊断
+
+    检查SQL的执行和读取耗时超过 threshold 秒时，在同一个会话中收集：
+    - SQL_ID 和子游标号（v$session.prev_sql_id，即本会话上一条执行的语句）
+    - DBMS_XPLAN.DISPLAY_CURSOR 输出的实际执行计划
+    - v$sql 中的执行次数、处理行数、逻辑读、物理读和平均耗时
+    - 客户端读取的行数和字符数
+    执行计划中出现对被监控表的全表扫描，且条件字段上没有前导列索引时，给出建索引建议。
+    结果写入单独的滚动日志文件；同一目标在 cooldown 秒内只收集一次，避免持续变慢时反复查询字典视图。
+    查询 v$session、v$sql 需要 SELECT_CATALOG_ROLE 或相应视图的查询权限，没有权限时只记录耗时。
+    """
+
+    def __init__(self, path=os.path.join('logs', 'slow_queries.log'), threshold=5.0, cooldown=3600,
+                 plan_format='TYPICAL', max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.plan_format = plan_format
+        self._last_capture = {}
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                            encoding='utf-8')
+        self._handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        self._output = logging.getLogger(DIAGNOSTICS_LOGGER)
+        self._output.setLevel(logging.INFO)
+        self._output.propagate = False
+        self._output.addHandler(self._handler)
+
+    def _should_capture(self, name):
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_capture.get(name)
+            if last is not None and now - last < self.cooldown:
+                return False
+            self._last_capture[name] = now
+            return True
+
+    def observe(self, connection, dialect, target, elapsed, rows, chars):
+        """记录一次检查查询的耗时，超过阈值时收集诊断信息
+
+        必须在借出的连接归还之前、且该连接上没有执行其他语句时调用。
+        """
+        if elapsed < self.threshold:
+            return
+        SLOW_QUERIES.labels(target=target.name).inc()
+        logger.warning(f"监控目标 {target.name} 的检查查询耗时 {elapsed:.3f} 秒，超过 {self.threshold} 秒")
+        if not self._should_capture(target.name):
+            return
+        lines = [
+            f"监控目标: {target.name}",
+            f"表: {target.table_name}  条件字段: {target.field_name}  条件值: {target.condition_value}",
+            f"查询耗时: {elapsed:.3f} 秒  读取行数: {rows}  读取字符数: {chars}",
+        ]
+        if dialect.name == 'oracle':
+            try:
+                lines.extend(self._oracle_details(connection, target))
+            except Exception as e:
+                lines.append(f"收集数据库端诊断信息失败（需要 v$session、v$sql 的查询权限）: {str(e)}")
+        else:
+            lines.append(f"数据库类型 {dialect.name} 不支持收集执行计划")
+        self._output.info('\n'.join(lines) + '\n' + '=' * 80)
+
+    def _oracle_details(self, connection, target):
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT prev_sql_id, prev_child_number FROM v$session "
+                           "WHERE sid = SYS_CONTEXT('USERENV', 'SID')")
+            sql_id, child = cursor.fetchone()
+            lines = [f"SQL_ID: {sql_id}  子游标: {child}"]
+
+            cursor.execute("SELECT executions, rows_processed, buffer_gets, disk_reads, elapsed_time, sql_text "
+                           "FROM v$sql WHERE sql_id = :sql_id AND child_number = :child",
+                           {'sql_id': sql_id, 'child': child})
+            row = cursor.fetchone()
+            if row is not None:
+                executions, rows_processed, buffer_gets, disk_reads, elapsed_time, sql_text = row
+                per_exec = (elapsed_time / executions / 1e6) if executions else 0.0
+                lines.append(f"执行次数: {executions}  累计处理行数: {rows_processed}  逻辑读: {buffer_gets}  "
+                             f"物理读: {disk_reads}  平均耗时: {per_exec:.3f} 秒")
+                lines.append(f"SQL: {sql_text}")
+
+            cursor.execute("SELECT plan_table_output FROM TABLE(DBMS_XPLAN.DISPLAY_CURSOR(:sql_id, :child, :format))",
+                           {'sql_id': sql_id, 'child': child, 'format': self.plan_format})
+            plan = [line for (line,) in cursor.fetchall()]
+            lines.append("执行计划:")
+            lines.extend(plan)
+            lines.extend(self._recommend_index(cursor, target, plan))
+            return lines
+        finally:
+            cursor.close()
+
+    def _recommend_index(self, cursor, target, plan):
+        owner, _, table = target.table_name.upper().rpartition('.')
+        if not any('TABLE ACCESS FULL' in line and table in line for line in plan):
+            return []
+        field = target.field_name.upper()
+        sql = ("SELECT index_name FROM all_ind_columns "
+               "WHERE table_name = :table_name AND column_name = :column_name AND column_position = 1")
+        params = {'table_name': table, 'column_name': field}
+        if owner:
+            sql += " AND table_owner = :owner"
+            params['owner'] = owner
+        else:
+            sql += " AND table_owner = SYS_CONTEXT('USERENV', 'CURRENT_SCHEMA')"
+        cursor.execute(sql, params)
+        indexes = [name for (name,) in cursor.fetchall()]
+        if indexes:
+            return [f"建议: 表 {target.table_name} 被全表扫描，但 {field} 上已有索引 {', '.join(indexes)}，"
+                    f"请检查统计信息是否过期或条件值的选择性"]
+        index_name = f"IX_{table}_{field}"[:30]
+        return [f"建议: 表 {target.table_name} 被全表扫描，可以在条件字段上建立索引：",
+                f"  CREATE INDEX {index_name} ON {target.table_name} ({field});"]
+
+    def close(self):
+        self._output.removeHandler(self._handler)
+        self._handler.close()
+
+
+def create_diagnostics(options):
+    """根据 [DIAGNOSTICS] 配置创建慢查询诊断，未配置时返回 None"""
+    if options is None:
+        return None
+    return SlowQueryDiagnostics(
+        path=options.get('path', os.path.join('logs', 'slow_queries.log')),
+        threshold=float(options.get('slow_query_seconds', 5)),
+        cooldown=float(options.get('cooldown', 3600)),
+        plan_format=options.get('plan_format', 'TYPICAL'),
+        max_bytes=int(options.get('max_bytes', 10 * 1024 * 1024)),
+        backup_count=int(options.get('backup_count', 5)),
+    )
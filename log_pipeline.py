@@ -0,0 +1,253 @@
+import os
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# 当前检查/发送/请求的关联ID，同一次检查中各模块输出的日志带有相同的ID
+_correlation_id = contextvars.ContextVar('correlation_id', default=None)
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(correlation)s%(message)s'
+
+
+def current_correlation_id():
+    return _correlation_id.get()
+
+
+def new_correlation_id(prefix='op'):
+    """生成 "前缀-8位随机数"；外层已有ID时新ID挂在其后（如 check-1a2b3c4d/send-5e6f7a8b）"""
+    cid = f"{prefix}-{os.urandom(4).hex()}"
+    parent = _correlation_id.get()
+    return f"{parent}/{cid}" if parent else cid
+
+
+def bind_correlation(cid):
+    """设置当前上下文的关联ID，返回用于 reset_correlation 的令牌"""
+    return _correlation_id.set(cid)
+
+
+def reset_correlation(token):
+    _correlation_id.reset(token)
+
+
+@contextmanager
+def correlation(prefix='op', cid=None):
+    """在 with 块内设置关联ID，未指定 cid 时按 new_correlation_id(prefix) 生成
+
+    一次检查中发送的邮件带有 检查ID/发送ID，便于从一次发送追溯到触发它的检查。
+    """
+    if cid is None:
+        cid = new_correlation_id(prefix)
+    token = _correlation_id.set(cid)
+    try:
+        yield cid
+    finally:
+        _correlation_id.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """在产生日志的线程中记录关联ID（日志随后由后台线程写出，届时已无法读取上下文）"""
+
+    def filter(self, record):
+        cid = _correlation_id.get()
+        record.correlation_id = cid
+        record.correlation = f"[{cid}] " if cid else ''
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """重复日志限流：同一位置输出的相同内容在 interval 秒内最多输出 burst 条
+
+    故障期间同一条错误往往每次重试、每个请求都会输出一次，超出的部分直接丢弃，
+    下一个周期的第一条日志会注明此前省略了多少条。burst 为 0 时不限流。
+    """
+
+    # 记录的不同日志内容超过该数量时清理已过期的计数
+    max_keys = 10000
+
+    def __init__(self, burst=20, interval=60.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not self.burst:
+            return True
+        key = (record.name, record.lineno, record.levelno, record.getMessage())
+        now = time.monotonic()
+        with self._lock:
+            if len(self._windows) > self.max_keys:
+                self._windows = {k: w for k, w in self._windows.items()
+                                 if now - w[0] < self.interval or w[2]}
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window is not None else 0
+                self._windows[key] = [now, 1, 0]
+            elif window[1] < self.burst:
+                window[1] += 1
+                return True
+            else:
+                window[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.getMessage()}（前 {self.interval:g} 秒内省略了 {suppressed} 条同类日志）"
+            record.args = None
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """每条日志输出为一行JSON，便于日志平台检索和按关联ID聚合"""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        cid = getattr(record, 'correlation_id', None)
+        if cid:
+            data['correlation_id'] = cid
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc_info'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record):
+        if not hasattr(record, 'correlation'):
+            record.correlation = ''
+        return super().format(record)
+
+
+class LoggingPipeline:
+    """非阻塞的日志管道
+
+    各线程只把日志记录放入内存队列（QueueHandler），由一个后台线程（QueueListener）
+    负责格式化并写入文件和控制台，检查和发送的线程不会因磁盘或控制台I/O而阻塞。
+    """
+
+    def __init__(self, handlers, burst=20, interval=60.0, max_queue=10000):
+        self.queue = queue.Queue(max_queue)
+        self.handler = _DroppingQueueHandler(self.queue)
+        self.handler.addFilter(ContextFilter())
+        self.handler.addFilter(RateLimitFilter(burst, interval))
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self._started = False
+
+    def start(self):
+        self.listener.start()
+        self._started = True
+        return self
+
+    def stop(self):
+        """停止后台线程，队列中剩余的日志会先写出"""
+        if self._started:
+            self._started = False
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """队列满时丢弃日志而不是阻塞调用方"""
+
+    def prepare(self, record):
+        # 在当前线程中完成参数插值和异常格式化（之后对象可能已变化），格式化交给后台线程；
+        # 异常堆栈保存在 exc_text 中，由输出端的格式化器决定如何输出
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+# configure_levels 设置过单独级别的模块
+_module_levels = set()
+
+
+def configure_levels(options, default_level='INFO'):
+    """设置根日志级别和各模块的日志级别，可在配置重新加载后再次调用
+
+    options 为 [LOGGING] 段：level 为默认级别，level.<模块名> 为单个模块的级别，
+    例如 level.smtp_client = WARNING、level.werkzeug = ERROR。
+    """
+    options = options or {}
+    logging.getLogger().setLevel(str(options.get('level', default_level)).upper())
+    names = set()
+    for key, value in options.items():
+        if key.startswith('level.'):
+            names.add(key[len('level.'):])
+            logging.getLogger(key[len('level.'):]).setLevel(str(value).upper())
+    # 配置中已删除的模块恢复为继承根日志级别
+    for name in _module_levels - names:
+        logging.getLogger(name).setLevel(logging.NOTSET)
+    _module_levels.clear()
+    _module_levels.update(names)
+
+
+def setup_logging(options=None, log_file=None, default_level='INFO'):
+    """按 [LOGGING] 配置安装非阻塞日志管道，返回 LoggingPipeline（程序退出时自动停止）
+
+    options:
+        format: text（默认）或 json
+        file: 日志文件路径，为空时不写文件；console: 是否同时输出到控制台
+        max_bytes / backup_count: 日志文件滚动设置
+        rate_limit / rate_interval: 同一位置的相同日志每 rate_interval 秒最多输出的条数，0 表示不限流
+        queue_size: 日志队列长度，队列满时丢弃新日志而不阻塞调用方
+    """
+    options = options or {}
+    if str(options.get('format', 'text')).lower() == 'json':
+        formatter = JSONFormatter()
+    else:
+        formatter = _TextFormatter(TEXT_FORMAT)
+
+    handlers = []
+    log_file = options.get('file', log_file)
+    if log_file:
+        directory = os.path.dirname(log_file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        handlers.append(RotatingFileHandler(
+            log_file,
+            maxBytes=int(options.get('max_bytes', 10 * 1024 * 1024)),
+            backupCount=int(options.get('backup_count', 5)),
+            encoding='utf-8',
+        ))
+    if str(options.get('console', 'true')).lower() in ('1', 'true', 'yes', 'on'):
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    pipeline = LoggingPipeline(
+        handlers,
+        burst=int(options.get('rate_limit', 20)),
+        interval=float(options.get('rate_interval', 60)),
+        max_queue=int(options.get('queue_size', 10000)),
+    )
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(pipeline.handler)
+    configure_levels(options, default_level)
+    atexit.register(pipeline.stop)
+    return pipeline.start()
@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+
+from backoff import Backoff
+from log_pipeline import correlation
+from metrics import EMAILS_SENT, EMAILS_FAILED, MAIL_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_SENDING = 'sending'
+STATUS_SENT = 'sent'
+STATUS_DEAD = 'dead'
+
+
+class MailQueue:
+    """基于SQLite的持久化发件队列
+
+    邮件先写入本地数据库再返回，由后台的 MailDispatcher 负责真正投递；
+    进程重启后未发送完的邮件会继续发送。
+    多个进程可以共用同一个队列文件：取出的邮件记录取出时间和取出者，
+    只有处于发送中超过 claim_timeout 秒（取出它的进程已退出或卡住）的邮件才会被重新投递。
+    """
+
+    def __init__(self, path, claim_timeout=600):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.claim_timeout = claim_timeout
+        # 取出者标识，同一台机器上的多个进程、同一进程中的多个队列对象互不相同
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{os.urandom(4).hex()}"
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " created_at REAL NOT NULL,"
+            " next_attempt_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " status TEXT NOT NULL,"
+            " receivers TEXT NOT NULL,"
+            " message TEXT NOT NULL,"
+            " last_error TEXT,"
+            " claimed_at REAL,"
+            " claimed_by TEXT)"
+        )
+        # 旧版本创建的队列文件补充取出者字段
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(outbox)")}
+        for column, column_type in (('claimed_at', 'REAL'), ('claimed_by', 'TEXT')):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE outbox ADD COLUMN {column} {column_type}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+        self._wakeup = threading.Event()
+
+    def enqueue(self, message, receivers):
+        """把邮件加入队列，返回队列中的ID
+
+        Args:
+            message: email.message.Message 对象或已序列化的字符串
+            receivers: 收件人列表
+        """
+        data = message if isinstance(message, str) else message.as_string()
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO outbox (created_at, next_attempt_at, status, receivers, message)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (now, now, STATUS_PENDING, json.dumps(list(receivers)), data),
+            )
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def claim(self):
+        """取出一封到期的邮件并标记为发送中，没有时返回None"""
+        now = time.time()
+        with self._lock:
+            # 使用写事务保证多个进程（如多个Web工作进程）不会取到同一封邮件
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # 取出者退出或卡住、超时仍处于发送中的邮件重新排队
+                self._db.execute(
+                    "UPDATE outbox SET status = ?, claimed_at = NULL, claimed_by = NULL"
+                    " WHERE status = ? AND claimed_at < ?",
+                    (STATUS_PENDING, STATUS_SENDING, now - self.claim_timeout),
+                )
+                row = self._db.execute(
+                    "SELECT id, attempts, receivers, message FROM outbox"
+                    " WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT 1",
+                    (STATUS_PENDING, now),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE outbox SET status = ?, claimed_at = ?, claimed_by = ? WHERE id = ?",
+                                     (STATUS_SENDING, now, self.owner, row[0]))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {'id': row[0], 'attempts': row[1], 'receivers': json.loads(row[2]), 'message': row[3]}
+
+    # 以下更新只作用于本对象取出的邮件：超时后已被其他进程重新取出的邮件不再修改
+
+    def mark_sent(self, item_id):
+        with self._lock:
+            self._db.execute("UPDATE outbox SET status = ?, attempts = attempts + 1, message = '',"
+                             " claimed_by = NULL WHERE id = ? AND claimed_by = ?",
+                             (STATUS_SENT, item_id, self.owner))
+
+    def mark_retry(self, item_id, error, delay):
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, next_attempt_at = ?,"
+                " last_error = ?, claimed_at = NULL, claimed_by = NULL WHERE id = ? AND claimed_by = ?",
+                (STATUS_PENDING, time.time() + delay, str(error), item_id, self.owner),
+            )
+
+    def mark_dead(self, item_id, error):
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ?, claimed_by = NULL"
+                " WHERE id = ? AND claimed_by = ?",
+                (STATUS_DEAD, str(error), item_id, self.owner),
+            )
+
+    def status(self, item_id):
+        """返回指定邮件的发送状态，不存在时返回None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, attempts, last_error FROM outbox WHERE id = ?", (item_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'id': item_id, 'status': row[0], 'attempts': row[1], 'last_error': row[2]}
+
+    def depth(self):
+        """返回待发送（含发送中）的邮件数量"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status IN (?, ?)", (STATUS_PENDING, STATUS_SENDING)
+            ).fetchone()[0]
+
+    def purge_sent(self, older_than_seconds=86400):
+        """删除已发送超过指定时间的记录"""
+        with self._lock:
+            self._db.execute("DELETE FROM outbox WHERE status = ? AND created_at < ?",
+                             (STATUS_SENT, time.time() - older_than_seconds))
+
+    def notify(self):
+        """唤醒等待中的投递线程"""
+        self._wakeup.set()
+
+    def wait(self, timeout):
+        """等待新邮件入队或超时"""
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class MailDispatcher:
+    """后台投递线程
+
+    启动 concurrency 个工作线程，每个线程持有自己的SMTP长连接；
+    投递失败按带抖动的指数退避重试，超过 max_attempts 次后移入死信（status=dead）。
+    """
+
+    def __init__(self, queue, client_factory, concurrency=2, max_attempts=5,
+                 backoff=None, poll_interval=1.0):
+        self.queue = queue
+        self.client_factory = client_factory
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff or Backoff(base_delay=5.0, max_delay=600.0)
+        self.poll_interval = poll_interval
+        self.sent = 0
+        self.failed = 0
+        self.dead = 0
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self.queue.purge_sent()
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._worker, name=f'mail-dispatcher-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"邮件发送队列已启动，并发数 {self.concurrency}，待发送 {self.queue.depth()} 封")
+
+    def stop(self, timeout=10):
+        self._stop_event.set()
+        self.queue.notify()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _deliver(self, client, item):
+        try:
+            client.send_message(item['message'], item['receivers'])
+        except Exception as e:
+            attempts = item['attempts'] + 1
+            self.failed += 1
+            EMAILS_FAILED.labels(source='queue').inc()
+            if attempts >= self.max_attempts:
+                self.dead += 1
+                logger.error(f"邮件 {item['id']} 发送失败 {attempts} 次，移入死信: {str(e)}")
+                self.queue.mark_dead(item['id'], e)
+            else:
+                delay = self.backoff.delay(attempts - 1)
+                logger.error(f"邮件 {item['id']} 发送失败，{delay:.1f} 秒后重试: {str(e)}")
+                self.queue.mark_retry(item['id'], e, delay)
+            return
+        self.sent += 1
+        EMAILS_SENT.labels(source='queue').inc()
+        self.queue.mark_sent(item['id'])
+        logger.info(f"邮件 {item['id']} 已成功发送到 {', '.join(item['receivers'])}")
+
+    def _worker(self):
+        client = self.client_factory()
+        try:
+            while not self._stop_event.is_set():
+                item = self.queue.claim()
+                if item is None:
+                    self.queue.wait(self.poll_interval)
+                    continue
+                # 同一封邮件每次重试的日志使用相同的关联ID
+                with correlation(cid=f"mail-{item['id']}"):
+                    self._deliver(client, item)
+        finally:
+            client.close()
+
+
+def create_mail_queue(queue_config, client_factory):
+    """根据 [MAIL_QUEUE] 配置创建并启动发件队列，未启用时返回 (None, None)"""
+    if queue_config is None or str(queue_config.get('enabled', 'false')).lower() not in ('1', 'true', 'yes', 'on'):
+        return None, None
+    queue = MailQueue(queue_config.get('path', os.path.join('state', 'mail_queue.db')),
+                      claim_timeout=float(queue_config.get('claim_timeout', 600)))
+    dispatcher = MailDispatcher(
+        queue,
+        client_factory,
+        concurrency=int(queue_config.get('concurrency', 2)),
+        max_attempts=int(queue_config.get('max_attempts', 5)),
+        backoff=Backoff(
+            base_delay=float(queue_config.get('retry_base_delay', 5)),
+            max_delay=float(queue_config.get('retry_max_delay', 600)),
+        ),
+    )
+    dispatcher.start()
+    MAIL_QUEUE_DEPTH.set_function(queue.depth)
+    return queue, dispatcher
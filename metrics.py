@@ -0,0 +1,237 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def _default(self):
+        # 没有标签的指标直接在自身上调用 inc/set/observe
+        return self.labels()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+    def render(self, name, labelnames, key):
+        return [f'{name}{_format_labels(labelnames, key)} {self.value}']
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    """可增可减的当前值；也可以通过 set_function 在采集时读取"""
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def set_function(self, function):
+        self._function = function
+
+    def render(self):
+        if self._function is not None:
+            try:
+                self.set(self._function())
+            except Exception as e:
+                logger.error(f"采集指标 {self.name} 失败: {str(e)}")
+        return super().render()
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def render(self, name, labelnames, key):
+        lines = []
+        cumulative = 0
+        with self._lock:
+            for bound, count in zip(self.buckets, self.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labelnames, key, ("le", bound))} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labelnames, key, ("le", "+Inf"))} {self.count}')
+            lines.append(f'{name}_sum{_format_labels(labelnames, key)} {self.sum}')
+            lines.append(f'{name}_count{_format_labels(labelnames, key)} {self.count}')
+        return lines
+
+
+class Histogram(_Metric):
+    """耗时直方图"""
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """以 Prometheus 文本格式输出所有指标"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+PHASE_SECONDS = REGISTRY.register(Histogram(
+    'monitor_phase_seconds', '监控检查各阶段耗时（acquire/query/render/send）', ['target', 'phase']))
+CHECK_SECONDS = REGISTRY.register(Histogram(
+    'monitor_check_seconds', '单个监控目标一次完整检查的耗时', ['target']))
+CHECK_FAILURES = REGISTRY.register(Counter(
+    'monitor_check_failures_total', '检查失败次数', ['target']))
+SLOW_QUERIES = REGISTRY.register(Counter(
+    'monitor_slow_queries_total', '耗时超过诊断阈值的检查查询次数', ['target']))
+CHECK_INTERVAL = REGISTRY.register(Gauge(
+    'monitor_check_interval_seconds', '监控目标当前使用的检查间隔', ['target']))
+ROWS_MATCHED = REGISTRY.register(Counter(
+    'monitor_rows_matched_total', '满足告警条件的行数', ['target']))
+EMAILS_SENT = REGISTRY.register(Counter(
+    'emails_sent_total', '成功发送的邮件数', ['source']))
+EMAILS_FAILED = REGISTRY.register(Counter(
+    'emails_failed_total', '发送失败的邮件数', ['source']))
+DB_RECONNECTS = REGISTRY.register(Counter(
+    'db_reconnects_total', '重新获取数据库连接的次数', ['database']))
+MAIL_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'mail_queue_depth', '发件队列中待发送的邮件数'))
+NOTIFICATIONS = REGISTRY.register(Counter(
+    'monitor_notifications_total', '收到的数据变更推送通知次数', ['target']))
+CLUSTER_OWNED_TARGETS = REGISTRY.register(Gauge(
+    'cluster_owned_targets', '本节点持有租约的监控目标数'))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'http_request_seconds', 'Web接口处理耗时', ['endpoint', 'status']))
+
+
+def start_http_server(port, host='0.0.0.0'):
+    """在后台线程中提供 /metrics 接口，返回 server 对象（调用 shutdown() 停止）"""
+    # http.server 只在启用指标接口时才导入，各模块导入 metrics 时不必加载
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    logger.info(f"指标接口已启动: http://{host}:{port}/metrics")
+    return server
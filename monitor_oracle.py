@@ -1,106 +1,204 @@
-import cx_Oracle
-import time
-import configparser
 import os
-import logging
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import smtplib
-import ssl
 import sys
-from logging.handlers import RotatingFileHandler
+import logging
+import time
+import threading
+from functools import lru_cache
+from typing import NamedTuple
+from backoff import Backoff
+from smtp_client import SMTPClient
+from monitor_scheduler import MonitorTarget, MonitorScheduler
+from oracle_pool import OraclePool
+from db_drivers import ORACLE, create_dbapi_pool
+from alert_render import create_renderer, build_message
+from alerting import alert_key, create_alert_manager
+from metrics import (PHASE_SECONDS, ROWS_MATCHED, EMAILS_SENT, EMAILS_FAILED,
+                     start_http_server)
+from change_tracker import StateStore, SharedStateStore, ChangeTracker, MODE_FULL, MODE_WATERMARK
+from settings import (load_config as load_settings, ConfigWatcher, ConfigError,
+                      SMTP_REQUIRED, ORACLE_REQUIRED)
+from log_pipeline import setup_logging as install_logging, configure_levels, correlation
 
 # 设置日志
-def setup_logging():
-    # 创建logs目录（如果不存在）
-    log_dir = 'logs'
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-    
-    # 设置日志文件路径
-    log_file = os.path.join(log_dir, 'oracle_monitor.log')
-    
-    # 创建日志处理器
-    file_handler = RotatingFileHandler(
-        log_file,
-        maxBytes=10*1024*1024,  # 10MB
-        backupCount=5,
-        encoding='utf-8'
-    )
-    
-    # 设置日志格式
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(formatter)
-    
-    # 配置根日志记录器
-    root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
-    
-    # 同时输出到控制台
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
-    
-    return root_logger
+def setup_logging(options=None):
+    """安装非阻塞日志管道，返回 LoggingPipeline
+
+    各线程只把日志放入内存队列，由后台线程写入 logs/oracle_monitor.log（10MB滚动，保留5个）和控制台，
+    检查和发送不会因日志I/O而阻塞。options 为 [LOGGING] 段，可配置JSON格式、限流和各模块的日志级别。
+    """
+    return install_logging(options, log_file=os.path.join('logs', 'oracle_monitor.log'))
+
+# 日志处理器在程序入口处通过 setup_logging() 配置，导入本模块时不产生副作用
+logger = logging.getLogger(__name__)
 
-logger = setup_logging()
+# 监控程序必须配置的项；[ORACLE] 只在有目标使用默认数据库时才需要，由 create_pool 检查
+MONITOR_REQUIRED = SMTP_REQUIRED
 
 def load_config():
-    """加载配置文件"""
-    config = configparser.ConfigParser()
-    
-    # 获取脚本所在目录（考虑PyInstaller打包情况）
-    if getattr(sys, 'frozen', False):
-        # 如果是打包后的EXE
-        application_path = os.path.dirname(sys.executable)
-        config_path = os.path.join(application_path, 'config.ini')
-        
-        # 如果外部没有配置文件，则尝试从打包资源中获取
-        if not os.path.exists(config_path):
-            bundle_dir = getattr(sys, '_MEIPASS', os.path.abspath(os.path.dirname(__file__)))
-            config_path = os.path.join(bundle_dir, 'config.ini')
-    else:
-        # 普通Python脚本运行
-        config_path = 'config.ini'
-    
-    # 读取配置文件
+    """加载配置文件，返回只读的配置快照（已应用环境变量覆盖）"""
     try:
-        config.read(config_path, encoding='utf-8')
-        logger.info(f"已加载配置文件: {config_path}")
+        config = load_settings(required=MONITOR_REQUIRED)
+        logger.info(f"已加载配置文件: {config.path}")
     except Exception as e:
         logger.error(f"读取配置文件失败: {str(e)}")
         raise
-        
     return config
 
-def connect_oracle(config):
-    """连接Oracle数据库"""
-    try:
-        connection = cx_Oracle.connect(
-            config['ORACLE']['username'],
-            config['ORACLE']['password'],
-            config['ORACLE']['dsn']
-        )
-        logger.info("成功连接到Oracle数据库")
-        return connection
-    except Exception as e:
-        logger.error(f"连接数据库失败: {str(e)}")
-        raise
+def create_pool(config, max_workers=4, database='default'):
+    """根据配置创建数据库连接池
 
-def check_field_value(connection, table_name, field_name, condition_value):
-    """检查指定表的字段值，并返回相关字段信息"""
+    database 为 default 时使用 [ORACLE] 段，其他名称使用 [DATABASE:名称] 段；
+    driver 为 oracle（默认）时创建Oracle会话池，否则创建对应驱动的 DB-API 连接池。
+    """
+    section = f'DATABASE:{database}'
+    if config.has_section(section):
+        options = config[section]
+    elif database == 'default':
+        section = 'ORACLE'
+        options = config['ORACLE'] if config.has_section('ORACLE') else {}
+    else:
+        raise KeyError(f"未配置数据库 [{section}]")
+    if options.get('driver', 'oracle').lower() != 'oracle':
+        return create_dbapi_pool(database, options, max_workers)
+    missing = [option for option in ORACLE_REQUIRED['ORACLE'] if not options.get(option)]
+    if missing:
+        raise ConfigError(f"[{section}] 缺少 {', '.join(missing)}")
+    backoff = Backoff(
+        base_delay=float(options.get('reconnect_base_delay', 1)),
+        max_delay=float(options.get('reconnect_max_delay', 30)),
+    )
+    return OraclePool(
+        options['username'],
+        options['password'],
+        options['dsn'],
+        min_size=int(options.get('pool_min', 1)),
+        max_size=int(options.get('pool_max', max_workers)),
+        increment=int(options.get('pool_increment', 1)),
+        ping_idle_seconds=float(options.get('ping_idle_seconds', 60)),
+        max_attempts=int(options.get('reconnect_attempts', 5)),
+        backoff=backoff,
+        stmtcachesize=int(options.get('stmtcachesize', 50)),
+        name=database,
+    )
+
+DEFAULT_COLUMNS = ('JOB_NAME', 'JOB_RESULT_LOG')
+
+class CheckQuery(NamedTuple):
+    """检查SQL及其占位符对应的参数名（按出现顺序）"""
+    sql: str
+    params: tuple
+
+@lru_cache(maxsize=256)
+def build_check_query(table_name, field_name, condition_count, columns=DEFAULT_COLUMNS,
+                      log_column='JOB_RESULT_LOG', truncate_log=False,
+                      watermark_column=None, with_since=False, dialect=ORACLE, limit_rows=False):
+    """按数据库方言生成检查SQL
+
+    相同参数总是生成完全相同的SQL文本，配合连接上的语句缓存（stmtcachesize），
+    同一个目标每轮只需执行已解析好的语句。多个条件值合并为一个 IN 查询，N 个条件只需一次往返。
+    limit_rows 为 True 时按方言追加行数限制（FETCH FIRST / LIMIT），行数作为绑定参数传入。
+    """
+    params = []
+
+    def bind(name):
+        params.append(name)
+        return dialect.placeholder(name)
+
+    select_columns = [field_name]
+    for column in columns:
+        if truncate_log and column == log_column:
+            select_columns.append(dialect.truncate(column, bind('log_chars')))
+        else:
+            select_columns.append(column)
+    if watermark_column:
+        select_columns.append(watermark_column)
+    if condition_count == 1:
+        where = f"{field_name} = {bind('value')}"
+    else:
+        where = f"{field_name} IN ({', '.join(bind(f'value{i}') for i in range(condition_count))})"
+    query = f"SELECT {', '.join(select_columns)} FROM {table_name} WHERE {where}"
+    if watermark_column and with_since:
+        query += f" AND {watermark_column} > {bind('since')}"
+    if limit_rows:
+        query = dialect.limit(query, bind('max_rows'))
+    return CheckQuery(query, tuple(params))
+
+def iter_field_values(connection, table_name, field_name, condition_value,
+                      watermark_column=None, since=None, max_log_chars=None,
+                      arraysize=500, prefetch_rows=None, columns=DEFAULT_COLUMNS,
+                      log_column='JOB_RESULT_LOG', dialect=ORACLE, max_rows=None):
+    """以流式方式逐行返回满足条件的记录
+
+    Args:
+        condition_value: 单个条件值，或多个条件值组成的列表/元组
+        watermark_column: 增量检测使用的水位列，指定后会作为最后一列返回
+        since: 上次的水位值，只返回水位列大于该值的行
+        max_log_chars: 在数据库端截断 log_column（Oracle 使用 DBMS_LOB.SUBSTR），
+            避免把整个CLOB传到客户端；为None时返回完整内容
+        arraysize: 每次网络往返获取的行数
+        prefetch_rows: execute 时预取的行数，默认与 arraysize 相同（仅Oracle）
+        columns: 在条件字段之后返回的列，默认为 JOB_NAME, JOB_RESULT_LOG
+        log_column: 需要截断的大字段
+        dialect: 连接所属数据库的SQL方言，默认为Oracle
+        max_rows: 最多返回的行数，在数据库端限制；为None时不限制
+    """
+    if isinstance(condition_value, (list, tuple)):
+        conditions = tuple(condition_value)
+    else:
+        conditions = (condition_value,)
+    cursor = dialect.cursor(connection)
     try:
-        cursor = connection.cursor()
-        # 修改查询，同时获取JOB_NAME和JOB_RESULT_LOG字段
-        query = f"SELECT {field_name}, JOB_NAME, JOB_RESULT_LOG FROM {table_name} WHERE {field_name} = :value"
-        cursor.execute(query, {'value': condition_value})
-        results = cursor.fetchall()
-        cursor.close()
-        return results  # 返回满足条件的所有行
+        dialect.prepare_cursor(cursor, arraysize)
+        if prefetch_rows is not None:
+            cursor.prefetchrows = prefetch_rows
+        with_since = bool(watermark_column) and since is not None
+        truncate_log = bool(max_log_chars) and log_column in columns
+        query = build_check_query(table_name, field_name, len(conditions), tuple(columns),
+                                  log_column, truncate_log, watermark_column, with_since,
+                                  dialect, bool(max_rows))
+        if len(conditions) == 1:
+            values = {'value': conditions[0]}
+        else:
+            values = {f'value{i}': value for i, value in enumerate(conditions)}
+        values.update(log_chars=max_log_chars, since=since, max_rows=max_rows)
+        cursor.execute(query.sql, dialect.bind(query.params, values))
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                break
+            yield from rows
     except Exception as e:
         logger.error(f"查询数据失败: {str(e)}")
         raise
+    finally:
+        cursor.close()
+
+def check_field_value(connection, table_name, field_name, condition_value,
+                      watermark_column=None, since=None):
+    """检查指定表的字段值，并返回相关字段信息
+
+    Args:
+        watermark_column: 增量检测使用的水位列，指定后会作为最后一列返回
+        since: 上次的水位值，只返回水位列大于该值的行
+    """
+    # 返回满足条件的所有行
+    return list(iter_field_values(connection, table_name, field_name, condition_value,
+                                  watermark_column=watermark_column, since=since))
+
+_smtp_client = None
+_smtp_client_lock = threading.Lock()
+# 启用发件队列后，send_email 只负责入队，由后台线程投递
+_mail_queue = None
+# 配置 [DIAGNOSTICS] 后，检查查询超过阈值时收集执行计划
+_diagnostics = None
+
+def get_smtp_client(config):
+    """返回进程内共享的SMTP长连接客户端"""
+    global _smtp_client
+    with _smtp_client_lock:
+        if _smtp_client is None:
+            _smtp_client = SMTPClient.from_config(config['SMTP'])
+        return _smtp_client
 
 def send_email(config, subject, body, receiver_emails):
     """发送邮件
@@ -108,122 +206,438 @@ def send_email(config, subject, body, receiver_emails):
     Args:
         receiver_emails: 可以是单个邮箱字符串或多个邮箱组成的列表
     """
+    with correlation('send'):
+        _send_email(config, subject, body, receiver_emails)
+
+def _send_email(config, subject, body, receiver_emails):
     try:
         # 如果是字符串，将其转换为列表
         if isinstance(receiver_emails, str):
             # 处理可能的多个邮箱（以逗号分隔）
             receiver_emails = [email.strip() for email in receiver_emails.split(',')]
         
-        message = MIMEMultipart()
-        message["From"] = config['SMTP']['sender_email']
-        message["To"] = ', '.join(receiver_emails)  # 将多个收件人以逗号连接
-        message["Subject"] = subject
-        message.attach(MIMEText(body, "plain"))
-
-        smtp_server = config['SMTP']['server']
-        smtp_port = int(config['SMTP']['port'])
-        smtp_username = config['SMTP']['username']
-        smtp_password = config['SMTP']['password']
-
-        context = ssl.create_default_context()
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-
-        if smtp_port == 465:
-            with smtplib.SMTP_SSL(smtp_server, smtp_port, context=context) as server:
-                server.login(smtp_username, smtp_password)
-                server.sendmail(config['SMTP']['sender_email'], receiver_emails, message.as_string())
-        else:
-            with smtplib.SMTP(smtp_server, smtp_port) as server:
-                server.ehlo()
-                if server.has_extn('STARTTLS'):
-                    server.starttls(context=context)
-                    server.ehlo()
-                server.login(smtp_username, smtp_password)
-                server.sendmail(config['SMTP']['sender_email'], receiver_emails, message.as_string())
+        # body 为 RenderedAlert 时复用其已编码的正文和附件
+        message = build_message(config['SMTP']['sender_email'], receiver_emails, subject, body)
+
+        if _mail_queue is not None:
+            item_id = _mail_queue.enqueue(message, receiver_emails)
+            logger.info(f"邮件 {item_id} 已加入发送队列，收件人 {', '.join(receiver_emails)}")
+            return
 
+        # 复用已登录的SMTP会话，不再每封邮件都重新握手和登录
+        get_smtp_client(config).send_message(message, receiver_emails)
+
+        EMAILS_SENT.labels(source='monitor').inc()
         logger.info(f"邮件已成功发送到 {', '.join(receiver_emails)}")
     except Exception as e:
+        EMAILS_FAILED.labels(source='monitor').inc()
         logger.error(f"发送邮件失败: {str(e)}")
         raise
 
+def load_targets(config):
+    """读取所有监控目标
+
+    支持旧的单个 [MONITOR] 段，以及任意多个 [MONITOR:名称] 段。
+    [MONITOR] 中的配置同时作为各 [MONITOR:*] 段的默认值。
+    """
+    defaults = config['MONITOR'] if config.has_section('MONITOR') else {}
+    default_interval = int(defaults.get('check_interval', 300))  # 默认5分钟检查一次
+    default_subject = defaults.get('email_subject', '数据库监控告警')
+
+    targets = []
+    for section in config.sections():
+        if section == 'MONITOR':
+            if 'table_name' not in config[section]:
+                continue  # 只作为默认值使用
+            name = 'default'
+        elif section.startswith('MONITOR:'):
+            name = section.split(':', 1)[1].strip()
+        else:
+            continue
+
+        options = config[section]
+
+        def get(key, fallback=None):
+            value = options.get(key)
+            if value is None:
+                value = defaults.get(key, fallback)
+            if value is None:
+                raise KeyError(f"监控目标 {name} 缺少配置项 {key}")
+            return value
+
+        targets.append(MonitorTarget(
+            name=name,
+            table_name=get('table_name'),
+            field_name=get('field_name'),
+            condition_value=get('condition_value'),
+            receiver_emails=get('receiver_email'),
+            check_interval=int(get('check_interval', default_interval)),
+            email_subject=get('email_subject', default_subject),
+            options={**dict(defaults), **dict(options)},
+        ))
+
+    logger.info(f"共加载 {len(targets)} 个监控目标: {', '.join(t.name for t in targets)}")
+    return targets
+
+def create_tracker(store, target):
+    """根据目标配置创建增量检测器"""
+    mode = target.incremental_mode
+    # 水位列排在条件字段和投影列之后
+    watermark_index = 1 + len(target.columns) if mode == MODE_WATERMARK else None
+    if mode == MODE_WATERMARK and not target.watermark_column:
+        raise KeyError(f"监控目标 {target.name} 使用水位模式时必须配置 watermark_column")
+    if mode == MODE_WATERMARK and target.max_rows:
+        # 按水位截取前 N 行时，与最后一行水位相同的其余行（ORA_ROWSCN 按块记录，经常相同）
+        # 会被下一轮的 "水位 > 上次水位" 条件跳过，因此两者不能同时使用
+        raise ValueError(f"监控目标 {target.name} 使用水位模式时不能配置 max_rows")
+    return ChangeTracker(store, target.name, mode, watermark_index)
+
+# 各监控目标的告警渲染器，模板只读取和编译一次；配置重新加载后目标对象变化时重新创建
+_renderers = {}
+
+def get_renderer(target):
+    """获取监控目标的告警渲染器"""
+    cached = _renderers.get(target.name)
+    if cached is None or cached[0] is not target:
+        renderer = create_renderer(target.columns, target.options)
+        if renderer.attach_log_chars and 0 < target.max_log_chars <= renderer.attach_log_chars:
+            # 日志在数据库端已截断为 max_log_chars，不会超过 attach_log_chars
+            logger.warning(f"监控目标 {target.name} 的 attach_log_chars ({renderer.attach_log_chars}) "
+                           f"不小于 max_log_chars ({target.max_log_chars})，不会生成日志附件；"
+                           f"请调大 max_log_chars 或设为 0")
+        cached = _renderers[target.name] = (target, renderer)
+    return cached[1]
+
+def check_target(config, pool, target, tracker, alerts=None, send_func=None):
+    """执行单个监控目标的一次检查，有匹配记录时发送告警邮件
+
+    返回本轮读取到的满足条件的行数，调度器据此调整检查间隔。
+
+    Args:
+        alerts: AlertManager，为None时每轮都对所有匹配行告警（原有行为）
+        send_func: 发送函数 send_func(subject, body, receivers)，默认使用 send_email
+    """
+    if send_func is None:
+        send_func = lambda subject, body, receivers: send_email(config, subject, body, receivers)
+    watermark_column = target.watermark_column if tracker.mode == MODE_WATERMARK else None
+    cycle = alerts.engine.begin(target.name) if alerts is not None else None
+    phase_start = time.perf_counter()
+    with pool.acquire() as connection:
+        acquired = time.perf_counter()
+        PHASE_SECONDS.labels(target=target.name, phase='acquire').observe(acquired - phase_start)
+        # 检查并流式获取满足条件的行（水位模式下只获取上次水位之后的行）
+        # 多个条件值合并为一次 IN 查询
+        rows = iter_field_values(connection, target.table_name,
+                                 target.field_name, target.condition_values,
+                                 watermark_column=watermark_column,
+                                 since=tracker.since(),
+                                 max_log_chars=target.max_log_chars,
+                                 arraysize=target.fetch_arraysize,
+                                 columns=target.columns,
+                                 log_column=target.log_column,
+                                 dialect=pool.dialect,
+                                 max_rows=target.max_rows or None)
+
+        # 构建包含详细信息的邮件正文，增量模式下只对新增或发生变化的行告警
+        document = get_renderer(target).begin(
+            f"检测到表 {target.table_name} 中以下作业状态为 {target.condition_value}：\n\n")
+        column_count = len(target.columns)
+        # 查询与渲染交替进行，渲染耗时单独累计，其余计入查询阶段
+        render_seconds = 0.0
+        matched = 0
+        scanned = 0
+        fetched_chars = 0
+        diagnostics = _diagnostics
+
+        def count_scanned(rows):
+            nonlocal scanned, fetched_chars
+            for row in rows:
+                scanned += 1
+                if diagnostics is not None:
+                    fetched_chars += sum(len(value) for value in row if isinstance(value, str))
+                yield row
+
+        for row in tracker.filter(count_scanned(rows)):
+            matched += 1
+            render_start = time.perf_counter()
+            # 根据查询结果的列顺序获取字段值：条件字段、投影列（第一列作为作业名称）、水位列
+            status, values = row[0], row[1:1 + column_count]
+            # 抑制窗口内已经通知过的作业不再重复告警
+            if cycle is None or cycle.should_alert(alert_key(target.table_name, values[0], status)):
+                document.add_row(status, values)
+            render_seconds += time.perf_counter() - render_start
+        fetched = time.perf_counter()
+        # 查询耗时只扣除取数过程中穿插的渲染时间，取数之后的渲染不在该区间内
+        query_seconds = fetched - acquired - render_seconds
+        if diagnostics is not None:
+            # 慢查询时在同一会话中收集 SQL_ID 和执行计划，须在归还连接之前进行
+            diagnostics.observe(connection, pool.dialect, target, query_seconds,
+                                scanned, fetched_chars)
+
+    render_start = time.perf_counter()
+    subject = target.email_subject
+    # 达到 max_rows 上限时结果不完整，剩余的行未读取
+    truncated = bool(target.max_rows) and scanned >= target.max_rows
+    if truncated:
+        document.add_note(f"\n查询结果已达到 {target.max_rows} 行上限，其余记录未读取。\n")
+    # 只有完整的全量查询才能判断哪些作业已经恢复
+    resolved = []
+    if cycle is not None and alerts.engine.notify_resolved and tracker.mode == MODE_FULL and not truncated:
+        resolved = cycle.resolved()
+    if resolved:
+        document.add_note(
+            f"\n以下作业已恢复（不再处于 {target.condition_value} 状态）：\n"
+            + ''.join(f"作业名称: {key.split('|')[1]}\n" for key in resolved))
+        if document.rows == 0:
+            subject = f"[已恢复] {target.email_subject}"
+    body = document.build() if document.rows > 0 or resolved else None
+
+    render_seconds += time.perf_counter() - render_start
+    PHASE_SECONDS.labels(target=target.name, phase='query').observe(query_seconds)
+    PHASE_SECONDS.labels(target=target.name, phase='render').observe(render_seconds)
+    ROWS_MATCHED.labels(target=target.name).inc(matched)
+
+    notified = False
+    send_start = time.perf_counter()
+    if body:
+        receivers = [email.strip() for email in target.receiver_emails.split(',')]
+        if alerts is not None:
+            notified = alerts.deliver(send_func, subject, body, receivers)
+        else:
+            # 使用详细信息代替配置中的默认邮件正文
+            send_func(subject, body, receivers)
+            notified = True
+    elif cycle is not None and cycle.suppressed:
+        logger.info(f"监控目标 {target.name} 有 {cycle.suppressed} 条告警在抑制窗口内，本轮不发送")
+    if body:
+        PHASE_SECONDS.labels(target=target.name, phase='send').observe(time.perf_counter() - send_start)
+
+    if cycle is not None:
+        cycle.commit(notified, partial=truncated)
+    # 告警发送成功后才提交新的水位/指纹，发送失败时下一轮会重新告警
+    if notified or not body:
+        tracker.commit()
+    return scanned
+
 def monitor_database():
     """监控数据库主函数"""
+    global _mail_queue, _diagnostics
     config = load_config()
-    check_interval = int(config['MONITOR'].get('check_interval', 300))  # 默认5分钟检查一次
-    connection = None
-    
-    while True:
-        try:
-            # 检查连接是否有效
-            if connection is None:
-                connection = connect_oracle(config)
-            else:
-                try:
-                    # 尝试执行一个简单的查询来检查连接是否有效
-                    cursor = connection.cursor()
-                    cursor.execute("SELECT 1 FROM DUAL")
-                    cursor.close()
-                except cx_Oracle.DatabaseError:
-                    # 如果查询失败，说明连接已断开，需要重新连接
-                    logger.info("数据库连接已断开，尝试重新连接...")
-                    try:
-                        connection.close()
-                    except:
-                        pass
-                    connection = connect_oracle(config)
-            
-            table_name = config['MONITOR']['table_name']
-            field_name = config['MONITOR']['field_name']
-            condition_value = config['MONITOR']['condition_value']
-            receiver_emails = config['MONITOR']['receiver_email']
-
-            # 检查并获取满足条件的行
-            results = check_field_value(connection, table_name, field_name, condition_value)
-            
-            if results and len(results) > 0:
-                subject = config['MONITOR'].get('email_subject', '数据库监控告警')
-                
-                # 构建包含详细信息的邮件正文
-                detail_body = f"检测到表 {table_name} 中以下作业状态为 {condition_value}：\n\n"
-                for row in results:
-                    # 根据查询结果的列顺序获取字段值
-                    status, job_name, job_result_log = row
-                    detail_body += f"作业名称: {job_name}\n"
-                    detail_body += f"作业状态: {status}\n"
-                    detail_body += f"错误日志: {job_result_log}\n"
-                    detail_body += "-" * 50 + "\n"
-                
-                # 使用详细信息代替配置中的默认邮件正文
-                body = detail_body
-                send_email(config, subject, body, receiver_emails)
+    targets = load_targets(config)
+    monitor_options = config['MONITOR'] if config.has_section('MONITOR') else {}
+    max_workers = int(monitor_options.get('max_workers', 4))
+    retry_interval = int(monitor_options.get('retry_interval', 60))  # 出错后最长等待1分钟再重试
+
+    cluster_options = config['CLUSTER'] if config.has_section('CLUSTER') else None
+    # 使用同一个数据库的目标共享一个连接池；租约保存在Oracle中时为续约线程多留一个会话
+    pools = {}
+    if (config.getboolean('CLUSTER', 'enabled')
+            and config.get('CLUSTER', 'backend', 'oracle').lower() == 'oracle'):
+        pools['default'] = create_pool(config, max_workers + 1)
+
+    def ensure_pools(config, targets):
+        for target in targets:
+            if target.database not in pools:
+                pools[target.database] = create_pool(config, max_workers, target.database)
+
+    ensure_pools(config, targets)
+    # 邮件发送与数据库检查解耦，邮件服务器变慢时不影响检查节奏
+    # 可选功能依赖的模块（sqlite3、asyncio、推送通知）只在启用时才导入，缩短启动时间
+    dispatcher = None
+    if config.has_section('MAIL_QUEUE'):
+        from mail_queue import create_mail_queue
+        _mail_queue, dispatcher = create_mail_queue(
+            config['MAIL_QUEUE'],
+            lambda: SMTPClient.from_config(config['SMTP']),
+        )
+    if config.has_section('DIAGNOSTICS'):
+        from diagnostics import create_diagnostics
+        _diagnostics = create_diagnostics(config['DIAGNOSTICS'])
+    # 多节点部署（可选）：按租约分配监控目标，每个目标同一时刻只由一个节点检查
+    coordinator = None
+    if cluster_options is not None:
+        from cluster import create_coordinator
+
+        def on_ownership_change(owned, gained):
+            # 接管的目标重新读取原节点保存的状态
+            store.invalidate(gained)
+            scheduler.update_targets(owned_targets())
+            # 接管的目标立即检查，不必等到下一个检查周期
+            scheduler.trigger(gained)
 
+        coordinator = create_coordinator(cluster_options, pools.get('default'), [target.name for target in targets],
+                                         on_change=on_ownership_change)
+    if coordinator is not None:
+        # 告警和增量检测状态保存在租约存储中，目标转移到其他节点后继续使用
+        store = SharedStateStore(coordinator.store)
+    else:
+        # 增量检测状态保存在本地文件中，重启后继续使用
+        store = StateStore(monitor_options.get('state_file', os.path.join('state', 'monitor_state.json')))
+    trackers = {target.name: create_tracker(store, target) for target in targets}
+    # 启动时读取并编译所有目标的告警模板，模板有误时立即报错
+    for target in targets:
+        get_renderer(target)
+
+    def owned_targets():
+        return [target for target in targets if coordinator is None or coordinator.owns(target.name)]
+
+    def check(target, send_func=None):
+        if coordinator is not None and not coordinator.owns(target.name):
+            # 租约已转移给其他节点，跳过以免重复查询和重复告警
+            logger.debug(f"监控目标 {target.name} 已由其他节点负责，跳过本次检查")
+            return
+        # 本次检查输出的日志（包括发送告警）带有同一个关联ID
+        with correlation(f'check-{target.name}'):
+            return check_target(config, pools[target.database], target, trackers[target.name],
+                                alerts, send_func)
+    # 指标接口（可选）：配置 [METRICS] port 后在该端口提供 /metrics
+    metrics_server = None
+    if config.has_section('METRICS') and config['METRICS'].get('port'):
+        metrics_server = start_http_server(int(config['METRICS']['port']),
+                                           config['METRICS'].get('host', '127.0.0.1'))
+    # 告警去重、限流和汇总（未配置 [ALERT] 段时保持每轮都告警）
+    alerts = create_alert_manager(
+        config['ALERT'] if config.has_section('ALERT') else None,
+        store,
+        lambda subject, body, receivers: send_email(config, subject, body, receivers),
+    )
+    if monitor_options.get('runtime', 'threads') == 'asyncio':
+        from async_runtime import AsyncMonitorScheduler, AsyncMailSender
+        # 事件驱动的调度：单线程调度所有目标，数据库调用在线程池中执行；
+        # 未启用发件队列时，邮件在事件循环上异步发送
+        sender = AsyncMailSender(config['SMTP']) if _mail_queue is None else None
+        scheduler = AsyncMonitorScheduler(
+            targets,
+            lambda target: check(target, sender.send_threadsafe if sender is not None else None),
+            max_workers=max_workers,
+            retry_interval=retry_interval,
+            services=[sender] if sender is not None else [],
+        )
+    else:
+        scheduler = MonitorScheduler(
+            targets,
+            check,
+            max_workers=max_workers,
+            retry_interval=retry_interval,
+        )
+    if coordinator is not None:
+        coordinator.start()
+        scheduler.update_targets(owned_targets())
+    # 推送模式（可选）：数据变更时立即检查，定时轮询作为兜底
+    notifier = None
+    if config.has_section('NOTIFY'):
+        from change_notify import create_notification_source
+        # 推送通知使用 [ORACLE] 中的连接信息，只适用于默认Oracle数据库上的目标
+        notifier = create_notification_source(
+            config['NOTIFY'], config.section('ORACLE'),
+            [target for target in targets
+             if target.database == 'default' and pools[target.database].dialect is ORACLE])
+    if notifier is not None:
+        import cx_Oracle
+        try:
+            notifier.start(scheduler.trigger)
         except cx_Oracle.DatabaseError as e:
-            logger.error(f"数据库错误: {str(e)}")
-            if connection:
-                try:
-                    connection.close()
-                except:
-                    pass
-            connection = None
-            time.sleep(60)  # 数据库错误后等待1分钟再重试
-            continue
-            
-        except Exception as e:
-            logger.error(f"监控过程发生错误: {str(e)}", exc_info=True)
-            if connection:
-                try:
-                    connection.close()
-                except:
-                    pass
-            connection = None
-            time.sleep(60)  # 其他错误后等待1分钟再重试
-            continue
-        
-        logger.info(f"等待 {check_interval} 秒后进行下一次检查...")
-        time.sleep(check_interval)
+            logger.error(f"启用数据变更通知失败，仅使用定时轮询: {str(e)}")
+            notifier.close()
+            notifier = None
+
+    def apply_config(old, new):
+        """配置文件修改后更新监控目标，无需重启即可增加、删除或修改目标"""
+        nonlocal targets
+        try:
+            new_targets = load_targets(new)
+            if not new_targets:
+                raise ValueError("没有配置任何监控目标")
+            current = {target.name: target for target in targets}
+            new_trackers = {}
+            for target in new_targets:
+                if current.get(target.name) == target:
+                    continue
+                new_trackers[target.name] = create_tracker(store, target)
+                get_renderer(target)
+            # 新目标使用了新的数据库时创建对应的连接池
+            ensure_pools(new, new_targets)
+        except (KeyError, ValueError, OSError, ImportError) as e:
+            logger.error(f"新配置中的监控目标有误，继续使用原配置: {str(e)}")
+            return
+        # 未变化的目标保留原对象，已缓存的设置和渲染器继续有效
+        new_targets = [current.get(target.name) if current.get(target.name) == target else target
+                       for target in new_targets]
+        trackers.update(new_trackers)
+        targets = new_targets
+        if coordinator is not None:
+            coordinator.set_names([target.name for target in new_targets])
+        scheduler.update_targets(owned_targets())
+        logger.info(f"已应用新的监控目标配置，变化的目标: {', '.join(new_trackers) or '无'}")
+        # 日志级别立即生效，其余日志设置需要重启
+        configure_levels(new.section('LOGGING'))
+        if logging_output_options(old) != logging_output_options(new):
+            logger.warning("配置段 [LOGGING] 中除日志级别以外的修改需要重启后生效")
+        sections = {'ORACLE', 'SMTP', 'MAIL_QUEUE', 'ALERT', 'METRICS', 'NOTIFY', 'CLUSTER', 'DIAGNOSTICS'}
+        sections.update(name for name in old.sections() if name.startswith('DATABASE:'))
+        for section in sorted(sections):
+            if dict(old.section(section)) != dict(new.section(section)):
+                logger.warning(f"配置段 [{section}] 的修改需要重启后生效")
+
+    # 配置热加载：每 reload_interval 秒检查一次配置文件，0 表示关闭
+    watcher = None
+    reload_interval = float(monitor_options.get('reload_interval', 5))
+    if reload_interval > 0:
+        watcher = ConfigWatcher(required=MONITOR_REQUIRED, interval=reload_interval,
+                                on_change=apply_config, snapshot=config).start()
+    try:
+        scheduler.run()
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        scheduler.stop()
+        if notifier is not None:
+            notifier.close()
+        if coordinator is not None:
+            coordinator.stop()
+        for pool in pools.values():
+            pool.close()
+        if alerts is not None:
+            alerts.close()
+        if dispatcher is not None:
+            dispatcher.stop()
+            _mail_queue.close()
+            _mail_queue = None
+        if _smtp_client is not None:
+            _smtp_client.close()
+        if _diagnostics is not None:
+            _diagnostics.close()
+            _diagnostics = None
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+def logging_output_options(config):
+    """[LOGGING] 中日志级别以外的设置（格式、文件、限流），修改后需要重启"""
+    return {key: value for key, value in config.section('LOGGING').items()
+            if key != 'level' and not key.startswith('level.')}
+
+def check_config():
+    """只校验配置和告警模板，不连接数据库，供部署脚本和启动耗时测试使用"""
+    config = load_config()
+    targets = load_targets(config)
+    for target in targets:
+        create_tracker(None, target)
+        get_renderer(target)
+    # 连接池在第一次借出连接时才连接数据库，这里只校验数据库配置和驱动
+    for database in {target.database for target in targets}:
+        create_pool(config, database=database).close()
+    logger.info("配置检查通过")
 
 if __name__ == '__main__':
+    try:
+        logging_options = load_settings().section('LOGGING')
+    except Exception:
+        # 配置文件有误时先使用默认日志设置，具体错误在加载配置时记录
+        logging_options = None
+    setup_logging(logging_options)
+    if '--check-config' in sys.argv[1:]:
+        check_config()
+        sys.exit(0)
     try:
         logger.info("开始数据库监控...")
         monitor_database()
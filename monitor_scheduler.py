@@ -0,0 +1,313 @@
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
+
+from backoff import Backoff
+from metrics import CHECK_SECONDS, CHECK_FAILURES, CHECK_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class MonitorTarget:
+    """单个监控目标（对应配置文件中的一个 [MONITOR] 或 [MONITOR:*] 段）
+
+    创建后不再修改；由 options 解析出的设置在第一次使用时计算并缓存，
+    每轮检查不再重复解析。配置重新加载时会生成新的对象。
+    """
+    name: str
+    table_name: str
+    field_name: str
+    condition_value: str
+    receiver_emails: str
+    check_interval: int = 300
+    email_subject: str = '数据库监控告警'
+    options: dict = field(default_factory=dict)
+
+    def __post_init__(self):
+        if self.adaptive_interval and not self.min_interval <= self.check_interval <= self.max_interval:
+            raise ValueError(f"监控目标 {self.name} 的检查间隔必须满足 "
+                             f"min_interval <= check_interval <= max_interval")
+
+    @cached_property
+    def condition_values(self):
+        """条件值列表，配置中多个值用逗号分隔，例如 Error,Timeout,Killed"""
+        return tuple(value.strip() for value in self.condition_value.split(',') if value.strip())
+
+    @cached_property
+    def columns(self):
+        """条件字段之后需要查询的列，第一列作为作业名称，默认为 JOB_NAME, JOB_RESULT_LOG"""
+        columns = self.options.get('columns')
+        if not columns:
+            return ('JOB_NAME', 'JOB_RESULT_LOG')
+        return tuple(column.strip() for column in columns.split(',') if column.strip())
+
+    @cached_property
+    def log_column(self):
+        return self.options.get('log_column', 'JOB_RESULT_LOG')
+
+    @cached_property
+    def max_log_chars(self):
+        return int(self.options.get('max_log_chars', 1000))
+
+    @cached_property
+    def fetch_arraysize(self):
+        return int(self.options.get('fetch_arraysize', 500))
+
+    @cached_property
+    def max_rows(self):
+        """每次检查最多读取的行数，0 表示不限制"""
+        return int(self.options.get('max_rows', 0))
+
+    @cached_property
+    def database(self):
+        """被监控的数据库名称，对应 [DATABASE:名称] 段，默认为 [ORACLE] 中的数据库"""
+        return self.options.get('database', 'default')
+
+    @cached_property
+    def adaptive_interval(self):
+        """是否根据检查结果和查询耗时自动调整检查间隔"""
+        return str(self.options.get('adaptive_interval', 'false')).lower() in ('1', 'true', 'yes', 'on')
+
+    @cached_property
+    def min_interval(self):
+        return float(self.options.get('min_interval', max(self.check_interval / 4, 1)))
+
+    @cached_property
+    def max_interval(self):
+        return float(self.options.get('max_interval', self.check_interval * 4))
+
+    @cached_property
+    def quiet_after(self):
+        return float(self.options.get('quiet_after', 3600))
+
+    @cached_property
+    def max_query_ratio(self):
+        return float(self.options.get('max_query_ratio', 0.1))
+
+    @cached_property
+    def incremental_mode(self):
+        return self.options.get('incremental_mode', 'full')
+
+    @cached_property
+    def watermark_column(self):
+        return self.options.get('watermark_column') or None
+
+
+class AdaptiveInterval:
+    """根据最近的检查结果和查询耗时计算单个目标的下一次检查间隔
+
+    - 有匹配记录（存在失败的作业）时使用 min_interval，尽快发现新的失败和恢复
+    - 连续 quiet_after 秒没有匹配记录后，每再过 quiet_after 秒间隔翻一倍
+    - 查询耗时（指数加权平均）最多占间隔的 max_query_ratio，耗时高的目标自动降低频率
+    - 结果始终在 [min_interval, max_interval] 之间；未启用时固定为 check_interval
+    """
+
+    def __init__(self, smoothing=0.3):
+        self.smoothing = smoothing
+        self.avg_latency = None
+        self.active = False
+        self._quiet_since = time.monotonic()
+
+    def record(self, latency, matched, now=None):
+        """记录一次成功检查的耗时和匹配行数（matched 为None表示未知）"""
+        if matched is None:
+            return
+        now = time.monotonic() if now is None else now
+        if self.avg_latency is None:
+            self.avg_latency = latency
+        else:
+            self.avg_latency += self.smoothing * (latency - self.avg_latency)
+        self.active = matched > 0
+        if self.active:
+            self._quiet_since = now
+
+    def interval(self, target, now=None):
+        """按目标当前的配置计算下一次检查间隔（秒）"""
+        if not target.adaptive_interval:
+            return target.check_interval
+        now = time.monotonic() if now is None else now
+        if self.active:
+            interval = target.min_interval
+        else:
+            quiet_periods = int((now - self._quiet_since) // target.quiet_after)
+            interval = target.check_interval * 2 ** min(quiet_periods, 32)
+        if self.avg_latency and target.max_query_ratio > 0:
+            interval = max(interval, self.avg_latency / target.max_query_ratio)
+        interval = min(max(interval, target.min_interval), target.max_interval)
+        CHECK_INTERVAL.labels(target=target.name).set(interval)
+        return interval
+
+
+class TargetStats:
+    """记录单个目标的执行耗时统计"""
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.last_latency = None
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+        self.last_error = None
+        self.consecutive_failures = 0
+
+    def record(self, latency, error=None):
+        self.runs += 1
+        self.last_latency = latency
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        if error is not None:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error)
+        else:
+            self.consecutive_failures = 0
+
+    def as_dict(self):
+        return {
+            'runs': self.runs,
+            'failures': self.failures,
+            'last_latency': self.last_latency,
+            'avg_latency': self.total_latency / self.runs if self.runs else None,
+            'max_latency': self.max_latency,
+            'last_error': self.last_error,
+            'consecutive_failures': self.consecutive_failures,
+        }
+
+
+class MonitorScheduler:
+    """多目标并发调度器
+
+    每个目标按各自的 check_interval 独立调度（启用 adaptive_interval 时由 AdaptiveInterval 调整），
+    检查任务提交到有界线程池中执行。
+    同一目标在上一次检查完成前不会被重复提交，因此慢目标不会拖慢快目标。
+    检查失败后按带抖动的指数退避重试，最长不超过 retry_interval 秒。
+    """
+
+    def __init__(self, targets, check_func, max_workers=4, retry_interval=60):
+        if not targets:
+            raise ValueError("没有配置任何监控目标")
+        self.targets = list(targets)
+        self.check_func = check_func
+        self.max_workers = max_workers
+        self.retry_interval = retry_interval
+        self.backoff = Backoff(base_delay=1.0, max_delay=retry_interval)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._running = set()
+        # 检查执行期间收到推送通知的目标，检查结束后立即再执行一次
+        self._triggered = set()
+        self._wake_event = threading.Event()
+        self._next_run = {target.name: 0.0 for target in self.targets}
+        self._stats = {target.name: TargetStats() for target in self.targets}
+        self._intervals = {target.name: AdaptiveInterval() for target in self.targets}
+
+    def stop(self):
+        """请求调度器停止（正在执行的检查会执行完毕）"""
+        self._stop_event.set()
+        self._wake_event.set()
+
+    def trigger(self, names):
+        """收到数据变更通知后立即检查指定目标，可以从任意线程调用
+
+        正在执行的目标会在本次检查结束后再执行一次；处于失败退避中的目标仍按退避时间重试。
+        """
+        with self._lock:
+            for name in names:
+                if name not in self._next_run or self._stats[name].consecutive_failures:
+                    continue
+                if name in self._running:
+                    self._triggered.add(name)
+                else:
+                    self._next_run[name] = 0.0
+        self._wake_event.set()
+
+    def update_targets(self, targets):
+        """替换监控目标（配置重新加载后调用），可以从任意线程调用
+
+        新增的目标立即检查，已删除的目标不再调度，配置有变化的目标从下一次检查起使用新配置。
+        """
+        with self._lock:
+            self.targets = list(targets)
+            for target in self.targets:
+                if target.name not in self._next_run:
+                    self._next_run[target.name] = 0.0
+                    self._stats[target.name] = TargetStats()
+                    self._intervals[target.name] = AdaptiveInterval()
+        self._wake_event.set()
+
+    def latency_snapshot(self):
+        """返回每个目标的耗时统计，键为目标名称"""
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+    def _run_target(self, target):
+        start = time.monotonic()
+        error = None
+        matched = None
+        try:
+            # check_func 可以返回匹配的行数，用于调整检查间隔
+            matched = self.check_func(target)
+        except Exception as e:
+            error = e
+            logger.error(f"监控目标 {target.name} 检查失败: {str(e)}", exc_info=True)
+        latency = time.monotonic() - start
+        CHECK_SECONDS.labels(target=target.name).observe(latency)
+        if error is not None:
+            CHECK_FAILURES.labels(target=target.name).inc()
+
+        with self._lock:
+            stats = self._stats[target.name]
+            stats.record(latency, error)
+            self._running.discard(target.name)
+            adaptive = self._intervals[target.name]
+            if error is None:
+                adaptive.record(latency, matched)
+            # 以本次开始时间为基准计算下一次执行时间，避免间隔随查询耗时漂移
+            if error is not None:
+                delay = latency + self.backoff.delay(stats.consecutive_failures - 1)
+            elif target.name in self._triggered:
+                delay = 0.0
+            else:
+                delay = adaptive.interval(target)
+            self._triggered.discard(target.name)
+            self._next_run[target.name] = start + delay
+        # 唤醒调度循环，按新的执行时间重新计算等待时长
+        self._wake_event.set()
+
+        logger.info(f"监控目标 {target.name} 检查完成，耗时 {latency:.3f} 秒")
+
+    def _due_targets(self, now):
+        with self._lock:
+            due = [
+                target for target in self.targets
+                if target.name not in self._running and self._next_run[target.name] <= now
+            ]
+            for target in due:
+                self._running.add(target.name)
+            return due
+
+    def _seconds_until_next(self, now):
+        with self._lock:
+            pending = [
+                self._next_run[target.name] for target in self.targets
+                if target.name not in self._running
+            ]
+        if not pending:
+            return 1.0
+        return min(max(min(pending) - now, 0.0), 1.0)
+
+    def run(self):
+        """运行调度循环，直到调用 stop()"""
+        logger.info(f"启动多目标监控，共 {len(self.targets)} 个目标，工作线程数 {self.max_workers}")
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix='monitor') as executor:
+            while not self._stop_event.is_set():
+                for target in self._due_targets(time.monotonic()):
+                    executor.submit(self._run_target, target)
+                self._wake_event.wait(self._seconds_until_next(time.monotonic()))
+                self._wake_event.clear()
+        logger.info("多目标监控已停止")
@@ -0,0 +1,117 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from backoff import Backoff
+from db_drivers import ORACLE
+from metrics import DB_RECONNECTS
+
+logger = logging.getLogger(__name__)
+
+
+class OraclePool:
+    """基于 cx_Oracle.SessionPool 的共享连接池
+
+    - 会话池按 min_size/max_size 自动伸缩，多个监控线程共享
+    - 由会话池按每个会话的空闲时间检测：会话空闲超过 ping_idle_seconds 后，借出时先 ping，
+      已断开的会话由会话池自动替换；平时不再额外发送 SELECT 1 FROM DUAL
+    - 每个会话按 stmtcachesize 缓存已解析的语句
+    - 建池、借出或 ping 失败时按带抖动的指数退避重试，而不是固定等待1分钟
+    """
+
+    dialect = ORACLE
+
+    def __init__(self, username, password, dsn, min_size=1, max_size=4, increment=1,
+                 ping_idle_seconds=60, max_attempts=5, backoff=None, stmtcachesize=50, name='default'):
+        self.username = username
+        self.password = password
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.increment = increment
+        self.ping_idle_seconds = ping_idle_seconds
+        self.stmtcachesize = stmtcachesize
+        self.max_attempts = max_attempts
+        self.backoff = backoff or Backoff()
+        self.name = name
+        self.reconnects = 0
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        # 延迟导入：只有真正连接数据库时才加载Oracle客户端库，缩短程序启动时间
+        import cx_Oracle
+        with self._lock:
+            if self._pool is None:
+                self._pool = cx_Oracle.SessionPool(
+                    user=self.username,
+                    password=self.password,
+                    dsn=self.dsn,
+                    min=self.min_size,
+                    max=self.max_size,
+                    increment=self.increment,
+                    threaded=True,
+                    getmode=cx_Oracle.SPOOL_ATTRVAL_WAIT,
+                    encoding='UTF-8',
+                )
+                # 每个会话缓存已解析的语句，各目标固定的检查SQL不必每轮重新解析
+                self._pool.stmtcachesize = self.stmtcachesize
+                # 会话池记录每个会话的空闲时间，连接池整体繁忙时长期闲置的会话也会在借出前检测
+                self._pool.ping_interval = int(self.ping_idle_seconds)
+                logger.info(f"已创建Oracle连接池 (min={self.min_size}, max={self.max_size})")
+            return self._pool
+
+    def _drop(self, pool, connection):
+        try:
+            pool.drop(connection)
+        except Exception:
+            pass
+
+    def _checkout(self):
+        import cx_Oracle
+        last_error = None
+        for attempt in range(self.max_attempts):
+            if attempt > 0:
+                self.reconnects += 1
+                DB_RECONNECTS.labels(database=self.name).inc()
+                delay = self.backoff.delay(attempt - 1)
+                logger.info(f"{delay:.1f} 秒后重试获取数据库连接（第 {attempt} 次重试）")
+                time.sleep(delay)
+            try:
+                pool = self._get_pool()
+                # 会话空闲超过 ping_interval 时 acquire 会先 ping，已断开的会话被丢弃并重新建立
+                connection = pool.acquire()
+            except cx_Oracle.DatabaseError as e:
+                last_error = e
+                logger.error(f"获取数据库连接失败: {str(e)}")
+                continue
+            return pool, connection
+        raise last_error
+
+    @contextmanager
+    def acquire(self):
+        """借出一个连接，用完后自动归还；发生数据库错误的连接会被丢弃"""
+        import cx_Oracle
+        pool, connection = self._checkout()
+        try:
+            yield connection
+        except cx_Oracle.DatabaseError:
+            logger.info("数据库连接出错，丢弃该连接")
+            self._drop(pool, connection)
+            raise
+        except BaseException:
+            pool.release(connection)
+            raise
+        else:
+            pool.release(connection)
+
+    def close(self):
+        """关闭连接池"""
+        with self._lock:
+            if self._pool is not None:
+                try:
+                    self._pool.close(force=True)
+                except Exception as e:
+                    logger.error(f"关闭连接池失败: {str(e)}")
+                self._pool = None
@@ -0,0 +1,227 @@
+import os
+import sys
+import logging
+import threading
+import configparser
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+# 监控程序和Web应用共用的环境变量覆盖：(段, 配置项) -> 环境变量名
+ENV_OVERRIDES = {
+    ('SMTP', 'server'): 'SMTP_SERVER',
+    ('SMTP', 'port'): 'SMTP_PORT',
+    ('SMTP', 'username'): 'SMTP_USERNAME',
+    ('SMTP', 'password'): 'SMTP_PASSWORD',
+    ('SMTP', 'sender_email'): 'SENDER_EMAIL',
+    ('ORACLE', 'username'): 'ORACLE_USERNAME',
+    ('ORACLE', 'password'): 'ORACLE_PASSWORD',
+    ('ORACLE', 'dsn'): 'ORACLE_DSN',
+    ('WEB', 'log_level'): 'LOG_LEVEL',
+    ('WEB', 'port'): 'PORT',
+}
+# 通用覆盖：CONFIG__<段>__<配置项>，例如 CONFIG__MAIL_QUEUE__ENABLED=true
+ENV_PREFIX = 'CONFIG__'
+
+# 需要校验类型的配置项
+INT_OPTIONS = {
+    ('SMTP', 'port'),
+    ('ORACLE', 'pool_min'),
+    ('ORACLE', 'pool_max'),
+    ('MONITOR', 'check_interval'),
+    ('MONITOR', 'max_workers'),
+    ('MONITOR', 'retry_interval'),
+    ('MONITOR', 'max_rows'),
+    ('DATABASE', 'pool_min'),
+    ('DATABASE', 'pool_max'),
+    ('WEB', 'port'),
+    ('WEB', 'threads'),
+    ('METRICS', 'port'),
+}
+
+# 各入口程序必须配置的项
+SMTP_REQUIRED = {'SMTP': ('server', 'port', 'username', 'password', 'sender_email')}
+ORACLE_REQUIRED = {'ORACLE': ('username', 'password', 'dsn')}
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+class ConfigError(ValueError):
+    """配置文件内容不合法"""
+
+
+def default_config_path():
+    """返回配置文件路径（考虑PyInstaller打包情况）"""
+    if getattr(sys, 'frozen', False):
+        # 如果是打包后的EXE
+        application_path = os.path.dirname(sys.executable)
+        config_path = os.path.join(application_path, 'config.ini')
+
+        # 如果外部没有配置文件，则尝试从打包资源中获取
+        if not os.path.exists(config_path):
+            bundle_dir = getattr(sys, '_MEIPASS', os.path.abspath(os.path.dirname(__file__)))
+            config_path = os.path.join(bundle_dir, 'config.ini')
+        return config_path
+    # 普通Python脚本运行
+    return 'config.ini'
+
+
+class ConfigSnapshot:
+    """某一时刻的只读配置
+
+    提供与 ConfigParser 相同的读取方式（config['SMTP']['server']、has_section、sections），
+    各段都是只读映射；配置变化时整体替换为新的快照，正在使用旧快照的代码不受影响。
+    """
+
+    def __init__(self, sections, path=None, mtime=None):
+        self._sections = MappingProxyType({
+            name: MappingProxyType(dict(values)) for name, values in sections.items()
+        })
+        self.path = path
+        self.mtime = mtime
+
+    def __getitem__(self, section):
+        return self._sections[section]
+
+    def __contains__(self, section):
+        return section in self._sections
+
+    def has_section(self, section):
+        return section in self._sections
+
+    def sections(self):
+        return list(self._sections)
+
+    def section(self, name):
+        """返回指定段，不存在时返回空映射"""
+        return self._sections.get(name, MappingProxyType({}))
+
+    def get(self, section, option, fallback=None):
+        return self.section(section).get(option, fallback)
+
+    def getint(self, section, option, fallback=None):
+        value = self.get(section, option)
+        return fallback if value in (None, '') else int(value)
+
+    def getfloat(self, section, option, fallback=None):
+        value = self.get(section, option)
+        return fallback if value in (None, '') else float(value)
+
+    def getboolean(self, section, option, fallback=False):
+        value = self.get(section, option)
+        return fallback if value in (None, '') else str(value).lower() in TRUE_VALUES
+
+
+def _apply_env(sections, environ):
+    for (section, option), name in ENV_OVERRIDES.items():
+        if environ.get(name):
+            sections.setdefault(section, {})[option] = environ[name]
+    for name, value in environ.items():
+        if name.startswith(ENV_PREFIX) and name.count('__') == 2:
+            _, section, option = name.split('__')
+            sections.setdefault(section.upper(), {})[option.lower()] = value
+
+
+def _validate(sections, required):
+    errors = []
+    for section, options in required.items():
+        for option in options:
+            if not sections.get(section, {}).get(option):
+                errors.append(f"[{section}] 缺少 {option}")
+    for section, values in sections.items():
+        base = section.split(':', 1)[0]
+        for option, value in values.items():
+            if (base, option) in INT_OPTIONS and value != '':
+                try:
+                    int(value)
+                except ValueError:
+                    errors.append(f"[{section}] {option} 必须是整数: {value}")
+    if errors:
+        raise ConfigError('配置文件有误: ' + '; '.join(errors))
+
+
+def load_config(path=None, required=None, environ=None):
+    """读取配置文件并返回经过校验的 ConfigSnapshot
+
+    Args:
+        path: 配置文件路径，默认按 default_config_path() 查找
+        required: {段: (配置项, ...)}，缺少时抛出 ConfigError
+        environ: 环境变量，默认使用 os.environ
+    """
+    path = path or default_config_path()
+    parser = configparser.ConfigParser()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    parser.read(path, encoding='utf-8')
+    sections = {name: dict(parser[name]) for name in parser.sections()}
+    _apply_env(sections, os.environ if environ is None else environ)
+    _validate(sections, required or {})
+    return ConfigSnapshot(sections, path=path, mtime=mtime)
+
+
+class ConfigWatcher:
+    """监视配置文件变化并原子地替换快照
+
+    后台线程每 interval 秒检查一次文件修改时间，变化后重新读取并校验，
+    成功则替换 current 并调用 on_change(old, new)；新配置有误时记录错误并继续使用旧配置。
+    """
+
+    def __init__(self, path=None, required=None, interval=2.0, on_change=None, snapshot=None):
+        self.path = path or (snapshot.path if snapshot is not None else default_config_path())
+        self.required = required
+        self.interval = interval
+        self._listeners = [on_change] if on_change is not None else []
+        # 已经读取过配置时直接使用该快照，不再重复读取
+        self.current = snapshot if snapshot is not None else load_config(self.path, required)
+        self._mtime = self.current.mtime
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def add_listener(self, on_change):
+        self._listeners.append(on_change)
+
+    def check(self):
+        """检查文件是否有变化，有变化时重新加载，返回是否替换了快照"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        # 记录新的修改时间，配置有误时在文件再次修改前不重复报错
+        self._mtime = mtime
+        try:
+            snapshot = load_config(self.path, self.required)
+        except (ConfigError, configparser.Error, ValueError, OSError) as e:
+            # 文件写到一半、编码错误（UnicodeDecodeError）或读取失败时同样保留原配置
+            logger.error(f"重新加载配置失败，继续使用原配置: {str(e)}")
+            return False
+        old, self.current = self.current, snapshot
+        logger.info(f"已重新加载配置文件: {self.path}")
+        for listener in self._listeners:
+            try:
+                listener(old, snapshot)
+            except Exception as e:
+                logger.error(f"应用新配置失败: {str(e)}", exc_info=True)
+        return True
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                # 任何意外错误都不能让监视线程退出，否则热加载会静默失效
+                logger.error(f"检查配置文件失败: {str(e)}", exc_info=True)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='config-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
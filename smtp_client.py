@@ -0,0 +1,229 @@
+import ssl
+import time
+import queue
+import smtplib
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+def create_ssl_context():
+    """创建SMTP使用的SSL上下文（与原有行为一致，不校验证书）"""
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class SMTPClient:
+    """长连接的SMTP客户端
+
+    - 登录后的会话会被复用，多封邮件共用同一个TCP/TLS连接，不必每封都握手、登录
+    - 连接空闲超过 noop_idle_seconds 后，发送前先用 NOOP 确认会话仍然可用
+    - 会话被服务器断开时自动重连并重试一次
+    - 收件人较多时按 max_recipients 分批投递
+    - 同一连接发送 max_messages_per_connection 封后主动重连，避免触发服务商的会话限制
+    """
+
+    def __init__(self, server, port, username, password, sender_email,
+                 timeout=30, noop_idle_seconds=30, max_idle_seconds=300,
+                 max_recipients=50, max_messages_per_connection=100, debuglevel=0):
+        self.server = server
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.sender_email = sender_email
+        self.timeout = timeout
+        self.noop_idle_seconds = noop_idle_seconds
+        self.max_idle_seconds = max_idle_seconds
+        self.max_recipients = max_recipients
+        self.max_messages_per_connection = max_messages_per_connection
+        self.debuglevel = debuglevel
+        self.connects = 0
+        self._conn = None
+        self._sent_on_conn = 0
+        self._last_used = 0.0
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_config(cls, smtp_config, **kwargs):
+        """根据配置文件中的 [SMTP] 段创建客户端"""
+        return cls(
+            smtp_config['server'],
+            int(smtp_config['port']),
+            smtp_config['username'],
+            smtp_config['password'],
+            smtp_config['sender_email'],
+            timeout=float(smtp_config.get('timeout', 30)),
+            noop_idle_seconds=float(smtp_config.get('noop_idle_seconds', 30)),
+            max_idle_seconds=float(smtp_config.get('max_idle_seconds', 300)),
+            max_recipients=int(smtp_config.get('max_recipients', 50)),
+            max_messages_per_connection=int(smtp_config.get('max_messages_per_connection', 100)),
+            **kwargs
+        )
+
+    def _connect(self):
+        context = create_ssl_context()
+        if self.port == 465:
+            conn = smtplib.SMTP_SSL(self.server, self.port, timeout=self.timeout, context=context)
+            conn.set_debuglevel(self.debuglevel)
+        else:
+            conn = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+            conn.set_debuglevel(self.debuglevel)
+            conn.ehlo()
+            if conn.has_extn('STARTTLS'):
+                conn.starttls(context=context)
+                conn.ehlo()
+            else:
+                logger.warning("STARTTLS not supported by the server")
+        try:
+            conn.login(self.username, self.password)
+        except Exception:
+            self._close_conn(conn)
+            raise
+        self.connects += 1
+        self._sent_on_conn = 0
+        self._last_used = time.monotonic()
+        logger.info(f"已建立SMTP连接 {self.server}:{self.port}")
+        return conn
+
+    def _close_conn(self, conn):
+        try:
+            conn.quit()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _reset(self):
+        if self._conn is not None:
+            self._close_conn(self._conn)
+            self._conn = None
+
+    def _ensure_connected(self):
+        if self._conn is not None:
+            idle = time.monotonic() - self._last_used
+            if idle > self.max_idle_seconds or self._sent_on_conn >= self.max_messages_per_connection:
+                self._reset()
+            elif idle > self.noop_idle_seconds:
+                try:
+                    code, _ = self._conn.noop()
+                except smtplib.SMTPException:
+                    code = None
+                except OSError:
+                    code = None
+                if code != 250:
+                    logger.info("SMTP会话已失效，重新连接")
+                    self._reset()
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    def _batches(self, receivers):
+        for i in range(0, len(receivers), self.max_recipients):
+            yield receivers[i:i + self.max_recipients]
+
+    def send_message(self, message, receivers):
+        """通过复用的会话发送一封邮件
+
+        Args:
+            message: email.message.Message 对象或已序列化的字符串
+            receivers: 收件人列表
+        """
+        if isinstance(receivers, str):
+            receivers = [receivers]
+        data = message if isinstance(message, str) else message.as_string()
+        with self._lock:
+            for batch in self._batches(receivers):
+                try:
+                    self._ensure_connected().sendmail(self.sender_email, batch, data)
+                except OSError as e:
+                    # smtplib 的异常都是 OSError 的子类，只有会话断开才重试，其他拒绝原因直接抛出
+                    if not _is_disconnect(e):
+                        raise
+                    # 会话被服务器关闭或网络中断：重新连接后重试一次
+                    logger.info("SMTP连接已断开，重新连接后重试")
+                    self._reset()
+                    self._ensure_connected().sendmail(self.sender_email, batch, data)
+                self._sent_on_conn += 1
+                self._last_used = time.monotonic()
+
+    def close(self):
+        """关闭会话"""
+        with self._lock:
+            self._reset()
+
+
+def _is_disconnect(error):
+    """判断发送失败是否因为会话断开（可以重新连接后重试）
+
+    - SMTPServerDisconnected：连接已被关闭
+    - 421：服务器即将关闭会话
+    - 不属于 SMTPException 的 socket 错误：网络中断
+    5xx 等永久性错误和 (-1, b'\\x00\\x00\\x00') 这类异常响应（邮件可能已经发出）不重试，
+    否则同一封邮件可能被发送两次。
+    """
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421
+    return not isinstance(error, smtplib.SMTPException)
+
+
+class SMTPPoolTimeout(Exception):
+    """等待空闲SMTP连接超时"""
+
+
+class SMTPClientPool:
+    """多个SMTP长连接组成的连接池，供多线程的Web服务并发发送
+
+    连接都被占用时最多等待 acquire_timeout 秒，超时抛出 SMTPPoolTimeout，
+    避免长时间占用连接的请求让其他请求一直阻塞。
+    连接池关闭后仍在使用的客户端归还时直接断开，不会留下未关闭的SMTP会话。
+    """
+
+    def __init__(self, client_factory, size=4, acquire_timeout=30):
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self._clients = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(size):
+            self._clients.put(client_factory())
+
+    @contextmanager
+    def acquire(self):
+        """借出一个客户端，用完后自动归还"""
+        try:
+            client = self._clients.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise SMTPPoolTimeout(f"{self.acquire_timeout} 秒内没有空闲的SMTP连接") from None
+        try:
+            yield client
+        finally:
+            self._release(client)
+
+    def _release(self, client):
+        with self._lock:
+            if not self._closed:
+                self._clients.put(client)
+                return
+        client.close()
+
+    def send_message(self, message, receivers):
+        with self.acquire() as client:
+            client.send_message(message, receivers)
+
+    def close(self):
+        """关闭空闲的客户端，正在使用的客户端在归还时关闭"""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                client = self._clients.get_nowait()
+            except queue.Empty:
+                break
+            client.close()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# 各模块位于仓库根目录，测试直接按模块名导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# test_email_config.py 是连接真实SMTP服务器的手动脚本，不作为自动测试收集
+collect_ignore = ['test_email_config.py']
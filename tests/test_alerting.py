@@ -0,0 +1,191 @@
+import sqlite3
+
+import pytest
+
+import alerting
+from alerting import AlertEngine, AlertManager, RecipientRateLimiter, alert_key
+from change_tracker import StateStore, ChangeTracker, MODE_FULL
+from db_drivers import create_dbapi_pool
+from monitor_oracle import check_target
+from monitor_scheduler import MonitorTarget
+
+
+@pytest.fixture
+def store(tmp_path):
+    return StateStore(str(tmp_path / 'monitor_state.json'))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(alerting.time, 'time', lambda: now[0])
+    return now
+
+
+def test_same_alert_is_suppressed_within_window(store, clock):
+    engine = AlertEngine(store, suppress_seconds=3600)
+    key = alert_key('JOB_CONFIG', 'A', 'Error')
+
+    cycle = engine.begin('jobs')
+    assert cycle.should_alert(key)
+    cycle.commit(notified=True)
+
+    clock[0] += 600
+    cycle = engine.begin('jobs')
+    assert not cycle.should_alert(key)
+    assert cycle.suppressed == 1
+    cycle.commit(notified=True)
+
+    clock[0] += 3600
+    cycle = engine.begin('jobs')
+    assert cycle.should_alert(key)
+
+
+def test_failed_send_is_retried_next_round(store, clock):
+    engine = AlertEngine(store, suppress_seconds=3600)
+    key = alert_key('JOB_CONFIG', 'A', 'Error')
+    cycle = engine.begin('jobs')
+    assert cycle.should_alert(key)
+    cycle.commit(notified=False)
+
+    clock[0] += 60
+    assert engine.begin('jobs').should_alert(key)
+
+
+def test_zero_window_alerts_every_round(store, clock):
+    engine = AlertEngine(store, suppress_seconds=0)
+    key = alert_key('JOB_CONFIG', 'A', 'Error')
+    for _ in range(3):
+        cycle = engine.begin('jobs')
+        assert cycle.should_alert(key)
+        cycle.commit(notified=True)
+
+
+def test_resolved_lists_alerts_no_longer_present(store, clock):
+    engine = AlertEngine(store)
+    a, b = alert_key('JOB_CONFIG', 'A', 'Error'), alert_key('JOB_CONFIG', 'B', 'Error')
+    cycle = engine.begin('jobs')
+    cycle.should_alert(a)
+    cycle.should_alert(b)
+    cycle.commit(notified=True)
+
+    cycle = engine.begin('jobs')
+    cycle.should_alert(b)
+    assert cycle.resolved() == [a]
+    cycle.commit(notified=True)
+    # 已恢复的告警不再保留，只通知一次
+    assert engine.begin('jobs').resolved() == [b]
+
+
+def test_partial_commit_keeps_alerts_not_seen_this_round(store, clock):
+    engine = AlertEngine(store, suppress_seconds=3600)
+    a, b = alert_key('JOB_CONFIG', 'A', 'Error'), alert_key('JOB_CONFIG', 'B', 'Error')
+    cycle = engine.begin('jobs')
+    cycle.should_alert(a)
+    cycle.should_alert(b)
+    cycle.commit(notified=True)
+
+    # 结果被截断时只看到 B，A 的抑制状态仍然保留
+    clock[0] += 60
+    cycle = engine.begin('jobs')
+    assert not cycle.should_alert(b)
+    cycle.commit(notified=False, partial=True)
+
+    clock[0] += 60
+    cycle = engine.begin('jobs')
+    assert not cycle.should_alert(a)
+    assert cycle.suppressed == 1
+
+
+def test_recipient_rate_limiter():
+    limiter = RecipientRateLimiter(max_per_window=2, window_seconds=3600)
+    assert limiter.allow(['a@example.com', 'b@example.com']) == ['a@example.com', 'b@example.com']
+    assert limiter.allow(['a@example.com']) == ['a@example.com']
+    assert limiter.allow(['a@example.com', 'b@example.com']) == ['b@example.com']
+
+
+class Outbox:
+    def __init__(self):
+        self.sent = []
+
+    def __call__(self, subject, body, receivers):
+        self.sent.append((subject, str(body), receivers))
+
+
+@pytest.fixture
+def job_table(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE JOB_CONFIG (JOB_NAME TEXT, JOB_STATUS TEXT, JOB_RESULT_LOG TEXT)")
+    db.executemany("INSERT INTO JOB_CONFIG VALUES (?, ?, ?)",
+                   [('A', 'Error', 'a failed'), ('B', 'Error', 'b failed'), ('C', 'Success', '')])
+    db.commit()
+    yield db, create_dbapi_pool('jobs', {'driver': 'sqlite', 'path': path})
+    db.close()
+
+
+def test_check_target_suppresses_repeats_and_sends_resolved_notice(job_table, store, clock):
+    db, pool = job_table
+    target = MonitorTarget(name='jobs', table_name='JOB_CONFIG', field_name='JOB_STATUS',
+                           condition_value='Error', receiver_emails='ops@example.com',
+                           options={'max_log_chars': '0'})
+    tracker = ChangeTracker(store, target.name, MODE_FULL)
+    alerts = AlertManager(AlertEngine(store, suppress_seconds=3600))
+    outbox = Outbox()
+
+    assert check_target(None, pool, target, tracker, alerts, outbox) == 2
+    assert len(outbox.sent) == 1
+    subject, body, receivers = outbox.sent[0]
+    assert subject == target.email_subject
+    assert '作业名称: A' in body and '作业名称: B' in body
+    assert receivers == ['ops@example.com']
+
+    # 抑制窗口内同样的失败不再发送
+    clock[0] += 60
+    check_target(None, pool, target, tracker, alerts, outbox)
+    assert len(outbox.sent) == 1
+
+    # A 恢复后发送恢复通知
+    db.execute("UPDATE JOB_CONFIG SET JOB_STATUS = 'Success' WHERE JOB_NAME = 'A'")
+    db.commit()
+    clock[0] += 60
+    check_target(None, pool, target, tracker, alerts, outbox)
+    assert len(outbox.sent) == 2
+    subject, body, _ = outbox.sent[1]
+    assert subject == f"[已恢复] {target.email_subject}"
+    assert '以下作业已恢复' in body and '作业名称: A' in body
+    assert '作业名称: B' not in body
+    pool.close()
+
+
+def test_check_target_truncated_by_max_rows_keeps_suppression(job_table, store, clock):
+    db, pool = job_table
+    target = MonitorTarget(name='jobs', table_name='JOB_CONFIG', field_name='JOB_STATUS',
+                           condition_value='Error', receiver_emails='ops@example.com',
+                           options={'max_log_chars': '0', 'max_rows': '1'})
+    tracker = ChangeTracker(store, target.name, MODE_FULL)
+    alerts = AlertManager(AlertEngine(store, suppress_seconds=3600))
+    outbox = Outbox()
+
+    def move_to_end(job_name):
+        # 重新插入改变行的返回顺序，模拟查询没有稳定顺序
+        row = db.execute("SELECT * FROM JOB_CONFIG WHERE JOB_NAME = ?", (job_name,)).fetchone()
+        db.execute("DELETE FROM JOB_CONFIG WHERE JOB_NAME = ?", (job_name,))
+        db.execute("INSERT INTO JOB_CONFIG VALUES (?, ?, ?)", row)
+        db.commit()
+
+    assert check_target(None, pool, target, tracker, alerts, outbox) == 1
+    assert len(outbox.sent) == 1 and '作业名称: A' in outbox.sent[0][1]
+
+    # 截断后本轮只看到 B，B 是新告警
+    move_to_end('A')
+    clock[0] += 60
+    check_target(None, pool, target, tracker, alerts, outbox)
+    assert len(outbox.sent) == 2 and '作业名称: B' in outbox.sent[1][1]
+
+    # A 重新出现在结果中，仍在抑制窗口内，不再重复告警
+    move_to_end('B')
+    clock[0] += 60
+    check_target(None, pool, target, tracker, alerts, outbox)
+    assert len(outbox.sent) == 2
+    pool.close()
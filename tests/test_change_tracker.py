@@ -0,0 +1,91 @@
+import datetime
+
+from change_tracker import StateStore, ChangeTracker, MODE_FULL, MODE_WATERMARK, MODE_FINGERPRINT
+
+
+def make_store(tmp_path):
+    return StateStore(str(tmp_path / 'state' / 'monitor_state.json'))
+
+
+def test_full_mode_returns_every_row(tmp_path):
+    tracker = ChangeTracker(make_store(tmp_path), 'jobs', MODE_FULL)
+    rows = [('Error', 'A', 'log'), ('Error', 'B', 'log')]
+    assert tracker.since() is None
+    assert list(tracker.filter(rows)) == rows
+    tracker.commit()
+    assert list(tracker.filter(rows)) == rows
+
+
+def test_fingerprint_alerts_only_new_or_changed_rows(tmp_path):
+    tracker = ChangeTracker(make_store(tmp_path), 'jobs', MODE_FINGERPRINT)
+    first = [('Error', 'A', 'log 1'), ('Error', 'B', 'log 1')]
+    assert list(tracker.filter(first)) == first
+    tracker.commit()
+
+    # 内容未变化的行不再告警，内容变化的行视为新行
+    second = [('Error', 'A', 'log 1'), ('Error', 'B', 'log 2')]
+    assert list(tracker.filter(second)) == [('Error', 'B', 'log 2')]
+    tracker.commit()
+
+    # 离开告警条件后再次出现的行重新告警
+    assert list(tracker.filter([('Error', 'B', 'log 2')])) == []
+    tracker.commit()
+    assert list(tracker.filter(second)) == [('Error', 'A', 'log 1')]
+
+
+def test_fingerprint_state_is_kept_until_commit(tmp_path):
+    tracker = ChangeTracker(make_store(tmp_path), 'jobs', MODE_FINGERPRINT)
+    rows = [('Error', 'A', 'log')]
+    assert list(tracker.filter(rows)) == rows
+    # 告警发送失败时不提交，下一轮重新告警
+    assert list(tracker.filter(rows)) == rows
+    tracker.commit()
+    assert list(tracker.filter(rows)) == []
+
+
+def test_fingerprint_duplicate_rows_alert_once(tmp_path):
+    tracker = ChangeTracker(make_store(tmp_path), 'jobs', MODE_FINGERPRINT)
+    rows = [('Error', 'A', 'log'), ('Error', 'A', 'log')]
+    assert list(tracker.filter(rows)) == [('Error', 'A', 'log')]
+
+
+def test_watermark_advances_to_highest_value_on_commit(tmp_path):
+    tracker = ChangeTracker(make_store(tmp_path), 'jobs', MODE_WATERMARK, watermark_index=3)
+    rows = [('Error', 'A', 'log', 5), ('Error', 'B', 'log', 9), ('Error', 'C', 'log', None),
+            ('Error', 'D', 'log', 7)]
+    assert tracker.since() is None
+    assert list(tracker.filter(rows)) == rows
+    assert tracker.since() is None
+    tracker.commit()
+    assert tracker.since() == 9
+
+
+def test_watermark_without_rows_keeps_previous_value(tmp_path):
+    tracker = ChangeTracker(make_store(tmp_path), 'jobs', MODE_WATERMARK, watermark_index=3)
+    list(tracker.filter([('Error', 'A', 'log', 3)]))
+    tracker.commit()
+    assert list(tracker.filter([])) == []
+    tracker.commit()
+    assert tracker.since() == 3
+
+
+def test_state_survives_restart(tmp_path):
+    store = make_store(tmp_path)
+    when = datetime.datetime(2024, 3, 14, 10, 0, 0)
+    tracker = ChangeTracker(store, 'jobs', MODE_WATERMARK, watermark_index=1)
+    list(tracker.filter([('Error', when)]))
+    tracker.commit()
+    other = ChangeTracker(store, 'other', MODE_FINGERPRINT)
+    list(other.filter([('Error', 'A', 'log')]))
+    other.commit()
+
+    reloaded = make_store(tmp_path)
+    assert reloaded.get_watermark('jobs') == when
+    assert list(ChangeTracker(reloaded, 'other', MODE_FINGERPRINT).filter([('Error', 'A', 'log')])) == []
+
+
+def test_corrupt_state_file_starts_over(tmp_path):
+    path = tmp_path / 'monitor_state.json'
+    path.write_text('{not json', encoding='utf-8')
+    store = StateStore(str(path))
+    assert store.get_watermark('jobs') is None
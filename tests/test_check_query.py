@@ -0,0 +1,98 @@
+import sqlite3
+
+import pytest
+
+from db_drivers import ORACLE, SQLITE, Dialect, PostgreSQLDialect
+from monitor_oracle import build_check_query, create_tracker, iter_field_values
+from monitor_scheduler import MonitorTarget
+
+COLUMNS = ('JOB_NAME', 'JOB_RESULT_LOG')
+
+
+def build(dialect, condition_count=1, truncate_log=False, watermark_column=None, with_since=False,
+          limit_rows=False):
+    return build_check_query('JOB_CONFIG', 'JOB_STATUS', condition_count, COLUMNS, 'JOB_RESULT_LOG',
+                             truncate_log, watermark_column, with_since, dialect, limit_rows)
+
+
+def test_oracle_single_condition():
+    query = build(ORACLE)
+    assert query.sql == "SELECT JOB_STATUS, JOB_NAME, JOB_RESULT_LOG FROM JOB_CONFIG WHERE JOB_STATUS = :value"
+    assert query.params == ('value',)
+
+
+@pytest.mark.parametrize('dialect, sql', [
+    (ORACLE,
+     "SELECT JOB_STATUS, JOB_NAME, DBMS_LOB.SUBSTR(JOB_RESULT_LOG, :log_chars, 1), LAST_UPDATE "
+     "FROM JOB_CONFIG WHERE JOB_STATUS IN (:value0, :value1) AND LAST_UPDATE > :since "
+     "FETCH FIRST :max_rows ROWS ONLY"),
+    (SQLITE,
+     "SELECT JOB_STATUS, JOB_NAME, SUBSTR(JOB_RESULT_LOG, 1, :log_chars), LAST_UPDATE "
+     "FROM JOB_CONFIG WHERE JOB_STATUS IN (:value0, :value1) AND LAST_UPDATE > :since "
+     "LIMIT :max_rows"),
+    (PostgreSQLDialect(),
+     "SELECT JOB_STATUS, JOB_NAME, SUBSTR(JOB_RESULT_LOG, 1, %(log_chars)s), LAST_UPDATE "
+     "FROM JOB_CONFIG WHERE JOB_STATUS IN (%(value0)s, %(value1)s) AND LAST_UPDATE > %(since)s "
+     "FETCH FIRST %(max_rows)s ROWS ONLY"),
+    (Dialect('qmark'),
+     "SELECT JOB_STATUS, JOB_NAME, SUBSTR(JOB_RESULT_LOG, 1, ?), LAST_UPDATE "
+     "FROM JOB_CONFIG WHERE JOB_STATUS IN (?, ?) AND LAST_UPDATE > ? FETCH FIRST ? ROWS ONLY"),
+    (Dialect('format'),
+     "SELECT JOB_STATUS, JOB_NAME, SUBSTR(JOB_RESULT_LOG, 1, %s), LAST_UPDATE "
+     "FROM JOB_CONFIG WHERE JOB_STATUS IN (%s, %s) AND LAST_UPDATE > %s FETCH FIRST %s ROWS ONLY"),
+])
+def test_full_query_per_dialect(dialect, sql):
+    query = build(dialect, condition_count=2, truncate_log=True, watermark_column='LAST_UPDATE',
+                  with_since=True, limit_rows=True)
+    assert query.sql == sql
+    assert query.params == ('log_chars', 'value0', 'value1', 'since', 'max_rows')
+
+
+def test_bind_orders_positional_params():
+    values = {'value0': 'Error', 'value1': 'Timeout', 'since': 5, 'log_chars': 100, 'max_rows': 10}
+    params = ('log_chars', 'value0', 'value1', 'since', 'max_rows')
+    assert Dialect('qmark').bind(params, values) == [100, 'Error', 'Timeout', 5, 10]
+    assert ORACLE.bind(params, values) == values
+
+
+def test_same_arguments_return_cached_sql():
+    assert build(SQLITE, condition_count=3) is build(SQLITE, condition_count=3)
+
+
+def test_unknown_paramstyle_is_rejected():
+    with pytest.raises(ValueError):
+        Dialect('numeric')
+
+
+@pytest.fixture
+def connection():
+    db = sqlite3.connect(':memory:')
+    db.execute("CREATE TABLE JOB_CONFIG (JOB_NAME TEXT, JOB_STATUS TEXT, JOB_RESULT_LOG TEXT, LAST_UPDATE INTEGER)")
+    db.executemany("INSERT INTO JOB_CONFIG VALUES (?, ?, ?, ?)", [
+        ('A', 'Error', 'x' * 50, 1),
+        ('B', 'Timeout', 'b failed', 2),
+        ('C', 'Success', '', 3),
+        ('D', 'Error', 'd failed', 4),
+    ])
+    yield db
+    db.close()
+
+
+def test_sqlite_query_runs(connection):
+    rows = list(iter_field_values(connection, 'JOB_CONFIG', 'JOB_STATUS', ('Error', 'Timeout'),
+                                  watermark_column='LAST_UPDATE', since=1, max_log_chars=10,
+                                  arraysize=1, dialect=SQLITE))
+    assert rows == [('Timeout', 'B', 'b failed', 2), ('Error', 'D', 'd failed', 4)]
+
+    rows = list(iter_field_values(connection, 'JOB_CONFIG', 'JOB_STATUS', 'Error',
+                                  max_log_chars=10, dialect=SQLITE, max_rows=1))
+    assert rows == [('Error', 'A', 'x' * 10)]
+
+
+def test_watermark_mode_rejects_max_rows():
+    target = MonitorTarget(name='jobs', table_name='JOB_CONFIG', field_name='JOB_STATUS',
+                           condition_value='Error', receiver_emails='ops@example.com',
+                           options={'incremental_mode': 'watermark', 'watermark_column': 'ORA_ROWSCN',
+                                    'max_rows': '100'})
+    with pytest.raises(ValueError):
+        create_tracker(None, target)
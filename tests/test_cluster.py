@@ -0,0 +1,118 @@
+import time
+
+import pytest
+
+from change_tracker import SharedStateStore, ChangeTracker, MODE_WATERMARK
+from cluster import SQLiteLeaseStore, ShardCoordinator, assign
+
+NAMES = [f'target{i}' for i in range(12)]
+
+
+@pytest.fixture
+def lease_path(tmp_path):
+    return str(tmp_path / 'leases.db')
+
+
+def make_node(lease_path, node_id, lease_ttl=30, renew_interval=10, on_change=None):
+    return ShardCoordinator(SQLiteLeaseStore(lease_path), NAMES, node_id=node_id,
+                            lease_ttl=lease_ttl, renew_interval=renew_interval, on_change=on_change)
+
+
+def assert_disjoint(*nodes):
+    owned = [node.owned for node in nodes]
+    for i, a in enumerate(owned):
+        for b in owned[i + 1:]:
+            assert not a & b
+
+
+def test_assign_moves_only_targets_of_removed_node():
+    before = assign(NAMES, ['a', 'b', 'c'])
+    after = assign(NAMES, ['a', 'b'])
+    for name, node in before.items():
+        if node != 'c':
+            assert after[name] == node
+    assert set(after.values()) <= {'a', 'b'}
+
+
+def test_single_node_owns_everything(lease_path):
+    node = make_node(lease_path, 'a')
+    assert node.rebalance() == frozenset(NAMES)
+    assert node.owns('target0')
+
+
+def test_handoff_to_new_node_never_overlaps(lease_path):
+    a = make_node(lease_path, 'a')
+    b = make_node(lease_path, 'b')
+    a.rebalance()
+    # b 加入后，a 先保留租约一轮再交出，两个节点任何时候都不会同时负责同一个目标
+    for node in (b, a, b, a, b):
+        node.rebalance()
+        assert_disjoint(a, b)
+    assert a.owned | b.owned == frozenset(NAMES)
+    assert a.owned and b.owned
+    assert b.owned == frozenset(name for name, node in assign(NAMES, ['a', 'b']).items() if node == 'b')
+
+
+def test_graceful_stop_hands_targets_over_immediately(lease_path):
+    a = make_node(lease_path, 'a')
+    b = make_node(lease_path, 'b')
+    for node in (a, b, a, a, b):
+        node.rebalance()
+    a.stop()
+    assert b.rebalance() == frozenset(NAMES)
+
+
+def test_crashed_node_is_taken_over_after_lease_expires(lease_path):
+    a = make_node(lease_path, 'a', lease_ttl=0.4, renew_interval=0.1)
+    b = make_node(lease_path, 'b', lease_ttl=0.4, renew_interval=0.1)
+    for node in (a, b, a, a, b):
+        node.rebalance()
+    taken_by_a = a.owned
+    assert taken_by_a
+
+    # a 不再续约（进程挂起或宕机）：租约过期前 b 不能接管
+    b.rebalance()
+    assert not b.owned & taken_by_a
+    time.sleep(0.5)
+    # a 自己也会认为租约已失效，不再检查
+    assert not a.owns(next(iter(taken_by_a)))
+    assert b.rebalance() == frozenset(NAMES)
+
+
+def test_ownership_lapses_when_renewal_stalls(lease_path):
+    node = make_node(lease_path, 'a', lease_ttl=0.4, renew_interval=0.1)
+    node.rebalance()
+    assert node.owns('target0')
+    time.sleep(0.35)
+    assert not node.owns('target0')
+    assert node.owned == frozenset()
+    node.rebalance()
+    assert node.owns('target0')
+
+
+def test_on_change_reports_gained_targets(lease_path):
+    changes = []
+    a = make_node(lease_path, 'a', on_change=lambda owned, gained: changes.append((owned, gained)))
+    a.rebalance()
+    assert changes == [(frozenset(NAMES), frozenset(NAMES))]
+    a.rebalance()
+    assert len(changes) == 1
+
+
+def test_state_follows_target_to_new_owner(lease_path):
+    a = make_node(lease_path, 'a')
+    b = make_node(lease_path, 'b')
+    store_a, store_b = SharedStateStore(a.store), SharedStateStore(b.store)
+    a.rebalance()
+
+    tracker = ChangeTracker(store_a, 'target0', MODE_WATERMARK, watermark_index=1)
+    list(tracker.filter([('Error', 41), ('Error', 42)]))
+    tracker.commit()
+    # 其他目标的写入不会覆盖 target0 的状态
+    store_b.set_watermark('target1', 7)
+
+    a.stop()
+    b.rebalance()
+    store_b.invalidate(b.owned)
+    assert ChangeTracker(store_b, 'target0', MODE_WATERMARK, watermark_index=1).since() == 42
+    assert store_b.get_watermark('target1') == 7
@@ -0,0 +1,123 @@
+import time
+import threading
+
+import pytest
+
+from async_runtime import AsyncMonitorScheduler
+from change_notify import ManualNotificationSource
+from monitor_scheduler import MonitorScheduler, MonitorTarget
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("等待超时")
+        time.sleep(0.01)
+
+
+class BlockingCheck:
+    """第一次检查阻塞到 release() 为止，用于在检查进行中发送通知"""
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+        self._release = threading.Event()
+
+    def release(self):
+        self._release.set()
+
+    def __call__(self, target):
+        self.calls.append(target.name)
+        if len(self.calls) == 1:
+            self._release.wait(5)
+        if self.fail:
+            raise RuntimeError("数据库不可用")
+        return 0
+
+
+def make_target(name='jobs', table_name='ETL.JOB_CONFIG'):
+    # 检查间隔足够长，测试期间的额外检查只可能来自推送通知
+    return MonitorTarget(name=name, table_name=table_name, field_name='JOB_STATUS',
+                         condition_value='Error', receiver_emails='ops@example.com', check_interval=300)
+
+
+@pytest.fixture(params=['threads', 'asyncio'])
+def run_scheduler(request):
+    started = []
+
+    def start(targets, check_func, backoff=None):
+        if request.param == 'threads':
+            scheduler = MonitorScheduler(targets, check_func, max_workers=2, retry_interval=60)
+        else:
+            scheduler = AsyncMonitorScheduler(targets, check_func, max_workers=2, retry_interval=60)
+        if backoff is not None:
+            scheduler.backoff = backoff
+        thread = threading.Thread(target=scheduler.run, daemon=True)
+        thread.start()
+        started.append((scheduler, thread))
+        return scheduler
+
+    yield start
+    for scheduler, thread in started:
+        scheduler.stop()
+        thread.join(5)
+
+
+def test_notifications_during_check_merge_into_one_rerun(run_scheduler):
+    check = BlockingCheck()
+    scheduler = run_scheduler([make_target()], check)
+    source = ManualNotificationSource([make_target()])
+    source.start(scheduler.trigger)
+
+    wait_until(lambda: len(check.calls) == 1)
+    for _ in range(3):
+        source.notify('JOB_CONFIG')
+    check.release()
+
+    wait_until(lambda: len(check.calls) == 2)
+    time.sleep(0.3)
+    assert len(check.calls) == 2
+
+
+def test_notification_when_idle_checks_immediately(run_scheduler):
+    check = BlockingCheck()
+    check.release()
+    scheduler = run_scheduler([make_target('a'), make_target('b', 'OTHER_TABLE')], check)
+    source = ManualNotificationSource([make_target('a'), make_target('b', 'OTHER_TABLE')])
+    source.start(scheduler.trigger)
+
+    wait_until(lambda: len(check.calls) == 2)
+    source.notify('b')
+    wait_until(lambda: len(check.calls) == 3)
+    time.sleep(0.3)
+    assert check.calls[2] == 'b'
+    assert len(check.calls) == 3
+
+
+class FixedBackoff:
+    def delay(self, attempt):
+        return 60.0
+
+
+def test_notifications_are_ignored_while_backing_off(run_scheduler):
+    check = BlockingCheck(fail=True)
+    check.release()
+    scheduler = run_scheduler([make_target()], check, backoff=FixedBackoff())
+    source = ManualNotificationSource([make_target()])
+    source.start(scheduler.trigger)
+    wait_until(lambda: len(check.calls) == 1)
+    time.sleep(0.1)
+    source.notify('jobs')
+    time.sleep(0.3)
+    assert len(check.calls) == 1
+
+
+def test_unknown_names_are_ignored(run_scheduler):
+    check = BlockingCheck()
+    check.release()
+    scheduler = run_scheduler([make_target()], check)
+    wait_until(lambda: len(check.calls) == 1)
+    scheduler.trigger(['missing'])
+    time.sleep(0.2)
+    assert check.calls == ['jobs']